@@ -27,7 +27,7 @@ from qgis.PyQt.QtWidgets import (
     QToolBar,
     QAction
 )
-from qgis.PyQt.QtCore import Qt, pyqtSignal, QSettings, QEvent
+from qgis.PyQt.QtCore import Qt, pyqtSignal, QSettings, QEvent, QTimer
 from qgis.PyQt.QtGui import QIcon
 from qgis.core import (
     QgsProject, 
@@ -49,8 +49,10 @@ from .services.selection_service import SelectionService
 from .services.layer_operations_service import LayerOperationsService
 from .services.tree_reordering_service import TreeReorderingService
 from .services.signal_manager_service import SignalManagerService
+from .roles import ROLE_ID, ROLE_TYPE, ROLE_KEY, ROLE_NAME_LOWER, ROLE_ORIGINAL_NAME
 from .ui.layer_tree_builder import LayerTreeBuilder
 from .ui.context_menu import LayerContextMenu
+from .ui.icons import resource_icon
 from .ui.event_handlers import EventHandlers
 from .ui.filter_widget import FilterService
 import os
@@ -99,6 +101,21 @@ class LayersAdvancedDialog(QDockWidget):
         # Flag to prevent circular selection updates
         self._updating_selection = False
         
+        # Layer context menu, built on first right-click
+        self._layer_menu = None
+        
+        # Bound itemChanged slot, resolved once and reused for every
+        # connect/disconnect during visibility updates
+        self._visibility_slot = self.on_item_visibility_changed
+        
+        # Set by start_rename; the next itemChanged is routed to on_item_name_changed
+        self._rename_pending = False
+        
+        # Per-item trace messages in the debug console, toggled by the
+        # console's Verbose checkbox; off by default since every message
+        # appends to the console during a rebuild
+        self.debug_enabled = False
+        
         # Create the main widget
         main_widget = QWidget()
         self.setWidget(main_widget)
@@ -172,7 +189,12 @@ class LayersAdvancedDialog(QDockWidget):
         
         self.search_box = QLineEdit()
         self.search_box.setPlaceholderText("Search layers...")
-        self.search_box.textChanged.connect(self.filter_layers)
+        # Coalesce keystrokes so only the last one in a burst filters the tree
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(120)
+        self._filter_timer.timeout.connect(self._apply_search_filter)
+        self.search_box.textChanged.connect(self._filter_timer.start)
         search_layout.addWidget(self.search_box)
         
         clear_btn = QPushButton("Clear")
@@ -193,7 +215,7 @@ class LayersAdvancedDialog(QDockWidget):
         self.layer_tree.setColumnWidth(6, 150)
         self.layer_tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.layer_tree.customContextMenuRequested.connect(self.show_context_menu)
-        self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
+        self.layer_tree.itemChanged.connect(self._visibility_slot)
         self.layer_tree.itemSelectionChanged.connect(self.on_item_selected)
         
         # Enable multi-selection with Ctrl and Shift
@@ -269,6 +291,12 @@ class LayersAdvancedDialog(QDockWidget):
         debug_label = QLabel("<b>Debug Console:</b>")
         debug_header.addWidget(debug_label)
         
+        verbose_check = QCheckBox("Verbose")
+        verbose_check.setToolTip("Log per-item messages while the layer tree is built")
+        verbose_check.setChecked(self.debug_enabled)
+        verbose_check.toggled.connect(self.set_debug_enabled)
+        debug_header.addWidget(verbose_check)
+        
         clear_debug_btn = QPushButton("Clear")
         clear_debug_btn.setMaximumWidth(60)
         clear_debug_btn.clicked.connect(self.clear_debug)
@@ -296,6 +324,10 @@ class LayersAdvancedDialog(QDockWidget):
         scrollbar = self.debug_console.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
     
+    def set_debug_enabled(self, enabled):
+        """Turn per-item trace messages in the debug console on or off."""
+        self.debug_enabled = enabled
+    
     def clear_debug(self):
         """Clear the debug console."""
         self.debug_console.clear()
@@ -405,7 +437,9 @@ class LayersAdvancedDialog(QDockWidget):
                 pass
             
             # Apply the tree structure recursively using service
-            TreeReorderingService.apply_tree_reordering(self.layer_tree, root)
+            TreeReorderingService.apply_tree_reordering(
+                self.layer_tree, root, canvases=self.iface.mapCanvases()
+            )
             
             # Reconnect signals
             try:
@@ -426,7 +460,7 @@ class LayersAdvancedDialog(QDockWidget):
         """Update symbology checkbox states for a specific layer without rebuilding the tree."""
         # Disconnect itemChanged signal temporarily
         try:
-            self.layer_tree.itemChanged.disconnect(self.on_item_visibility_changed)
+            self.layer_tree.itemChanged.disconnect(self._visibility_slot)
         except (TypeError, RuntimeError):
             pass
         
@@ -443,7 +477,7 @@ class LayersAdvancedDialog(QDockWidget):
         finally:
             # Reconnect itemChanged signal
             try:
-                self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
+                self.layer_tree.itemChanged.connect(self._visibility_slot)
             except (TypeError, RuntimeError):
                 pass
     
@@ -472,12 +506,14 @@ class LayersAdvancedDialog(QDockWidget):
                 layer_item.removeChild(layer_item.child(0))
                 removed_count += 1
             self.log_debug(f"    Removed {removed_count} existing children")
+            FilterService.reset_search_cache()
             
             # Rebuild symbology items for this layer
             from qgis.core import QgsRasterLayer
             if isinstance(layer, QgsRasterLayer):
                 self.log_debug(f"    Calling LayerTreeBuilder.add_raster_symbology_items()...")
-                LayerTreeBuilder.add_raster_symbology_items(layer, layer_item, self)
+                # Builder trace messages only appear when verbose logging is on
+                LayerTreeBuilder.add_raster_symbology_items(layer, layer_item, None, self)
                 self.log_debug(f"    ✓ Rebuilt raster symbology for {layer.name()}, new child count: {layer_item.childCount()}")
             
         except Exception as e:
@@ -496,6 +532,9 @@ class LayersAdvancedDialog(QDockWidget):
             QTreeWidgetItem or None
         """
         self.log_debug(f"    _find_layer_item() searching for layer_id: {layer_id}")
+        # Per-item messages only when verbose logging is on
+        debug = self.debug_enabled
+        
         # Search through all items
         iterator = QTreeWidgetItemIterator(self.layer_tree)
         items_checked = 0
@@ -503,10 +542,11 @@ class LayersAdvancedDialog(QDockWidget):
             item = iterator.value()
             items_checked += 1
             # Check if this item represents a layer with matching ID
-            item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
+            item_type = item.data(0, ROLE_TYPE)
             if item_type == "layer":
-                item_layer_id = item.data(0, Qt.ItemDataRole.UserRole)
-                self.log_debug(f"      Found layer item: {item.text(0)} (id={item_layer_id})")
+                item_layer_id = item.data(0, ROLE_ID)
+                if debug:
+                    self.log_debug(f"      Found layer item: {item.text(0)} (id={item_layer_id})")
                 if item_layer_id == layer_id:
                     self.log_debug(f"      ✓ Match found!")
                     return item
@@ -524,14 +564,24 @@ class LayersAdvancedDialog(QDockWidget):
         
         # Temporarily disconnect the itemChanged signal to avoid recursion
         try:
-            self.layer_tree.itemChanged.disconnect(self.on_item_visibility_changed)
+            self.layer_tree.itemChanged.disconnect(self._visibility_slot)
         except (TypeError, RuntimeError):
             # Signal not connected, ignore
             pass
         
+        # Clear, rebuild and expand with one repaint at the end
+        updates_were_enabled = self.layer_tree.updatesEnabled()
+        self.layer_tree.setUpdatesEnabled(False)
+        
         try:
             # Clear existing items
             self.layer_tree.clear()
+            LayerTreeBuilder.reset_counts()
+            FilterService.reset_search_cache()
+            
+            # File sizes are only reused within one build, so a changed
+            # source file or swapped data source shows its current size
+            LayerTreeBuilder.clear_source_cache()
             
             # Get project and root
             project = QgsProject.instance()
@@ -550,13 +600,19 @@ class LayersAdvancedDialog(QDockWidget):
             self.info_label.setText(f"Total layers: {layer_count}")
         
         finally:
+            self.layer_tree.setUpdatesEnabled(updates_were_enabled)
+            
             # Reconnect the signal
             try:
-                self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
+                self.layer_tree.itemChanged.connect(self._visibility_slot)
             except (TypeError, RuntimeError):
                 # Already connected, ignore
                 pass
     
+    def _apply_search_filter(self):
+        """Run the debounced filter with the current search text."""
+        self.filter_layers(self.search_box.text())
+    
     def filter_layers(self, text):
         """Filter layers based on search text, including child layers in groups."""
         total_count, hidden_count = FilterService.filter_tree(self.layer_tree, text)
@@ -573,6 +629,12 @@ class LayersAdvancedDialog(QDockWidget):
     
     def on_item_visibility_changed(self, item, column):
         """Handle checkbox state change for layer visibility."""
+        if self._rename_pending:
+            # One-shot hand-off of the edit commit to the rename handler
+            self._rename_pending = False
+            self.on_item_name_changed(item, column)
+            return
+        
         if column != 0:
             return
         
@@ -580,14 +642,14 @@ class LayersAdvancedDialog(QDockWidget):
         self._updating_visibility = True
         
         try:
-            item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
+            item_type = item.data(0, ROLE_TYPE)
             is_checked = item.checkState(0) == Qt.CheckState.Checked
             
             self.log_debug(f"on_item_visibility_changed: type={item_type}, checked={is_checked}, name={item.text(0)}")
             
             if item_type == "layer":
                 # Handle layer visibility
-                layer_id = item.data(0, Qt.ItemDataRole.UserRole)
+                layer_id = item.data(0, ROLE_ID)
                 VisibilityService.set_layer_visibility(layer_id, is_checked)
                 self.layerVisibilityChanged.emit(layer_id, is_checked)
                 self.log_debug(f"  Layer visibility set")
@@ -597,13 +659,13 @@ class LayersAdvancedDialog(QDockWidget):
                 self.log_debug(f"  Handling group visibility")
                 # Block signals to prevent recursive calls during updates
                 try:
-                    self.layer_tree.itemChanged.disconnect(self.on_item_visibility_changed)
+                    self.layer_tree.itemChanged.disconnect(self._visibility_slot)
                 except (TypeError, RuntimeError):
                     pass  # Signal not connected
                 
                 try:
                     # Get the actual QGIS group node safely by name
-                    group_name = item.data(0, Qt.ItemDataRole.UserRole)
+                    group_name = item.data(0, ROLE_ID)
                     root = QgsProject.instance().layerTreeRoot()
                     group_node = root.findGroup(group_name)
                     if group_node:
@@ -611,7 +673,7 @@ class LayersAdvancedDialog(QDockWidget):
                         self.set_qgis_group_visibility_recursive(group_node, is_checked)
                 finally:
                     try:
-                        self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
+                        self.layer_tree.itemChanged.connect(self._visibility_slot)
                     except (TypeError, RuntimeError):
                         pass  # Already connected
             
@@ -633,8 +695,8 @@ class LayersAdvancedDialog(QDockWidget):
     
     def set_category_visibility(self, item, visible):
         """Toggle visibility of a categorized symbol category."""
-        layer_id = item.data(0, Qt.ItemDataRole.UserRole)
-        category_index = item.data(0, Qt.ItemDataRole.UserRole + 2)
+        layer_id = item.data(0, ROLE_ID)
+        category_index = item.data(0, ROLE_KEY)
         
         # Temporarily disconnect our handler to avoid catching our own signal
         project = QgsProject.instance()
@@ -648,9 +710,11 @@ class LayersAdvancedDialog(QDockWidget):
         
         try:
             # Update visibility using service
-            SymbologyService.update_category_visibility(
+            result = SymbologyService.update_category_visibility(
                 layer_id, category_index, visible, self.iface
             )
+            if not result.success:
+                self.log_debug(f"Could not update category visibility: {result.reason}")
         finally:
             # Reconnect our handler
             if layer:
@@ -661,8 +725,8 @@ class LayersAdvancedDialog(QDockWidget):
     
     def set_range_visibility(self, item, visible):
         """Toggle visibility of a graduated symbol range."""
-        layer_id = item.data(0, Qt.ItemDataRole.UserRole)
-        range_index = item.data(0, Qt.ItemDataRole.UserRole + 2)
+        layer_id = item.data(0, ROLE_ID)
+        range_index = item.data(0, ROLE_KEY)
         
         # Temporarily disconnect our handlers to avoid catching our own signals
         project = QgsProject.instance()
@@ -680,9 +744,11 @@ class LayersAdvancedDialog(QDockWidget):
         
         try:
             # Update visibility using service
-            SymbologyService.update_range_visibility(
+            result = SymbologyService.update_range_visibility(
                 layer_id, range_index, visible, self.iface
             )
+            if not result.success:
+                self.log_debug(f"Could not update range visibility: {result.reason}")
         finally:
             # Reconnect our handlers
             if layer:
@@ -697,8 +763,8 @@ class LayersAdvancedDialog(QDockWidget):
     
     def set_rule_visibility(self, item, visible):
         """Toggle visibility of a rule-based renderer rule."""
-        layer_id = item.data(0, Qt.ItemDataRole.UserRole)
-        rule_key = item.data(0, Qt.ItemDataRole.UserRole + 2)
+        layer_id = item.data(0, ROLE_ID)
+        rule_key = item.data(0, ROLE_KEY)
         
         # Temporarily disconnect our handler to avoid catching our own signal
         project = QgsProject.instance()
@@ -712,9 +778,11 @@ class LayersAdvancedDialog(QDockWidget):
         
         try:
             # Update visibility using service
-            SymbologyService.update_rule_visibility(
+            result = SymbologyService.update_rule_visibility(
                 layer_id, rule_key, visible, self.iface
             )
+            if not result.success:
+                self.log_debug(f"Could not update rule visibility: {result.reason}")
         finally:
             # Reconnect our handler
             if layer:
@@ -738,10 +806,10 @@ class LayersAdvancedDialog(QDockWidget):
             return
         
         item = selected_items[0]
-        item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
+        item_type = item.data(0, ROLE_TYPE)
         
         if item_type == "layer":
-            layer_id = item.data(0, Qt.ItemDataRole.UserRole)
+            layer_id = item.data(0, ROLE_ID)
             self.layerSelected.emit(layer_id)
             
             # Select layer in QGIS using service
@@ -756,7 +824,7 @@ class LayersAdvancedDialog(QDockWidget):
         
         elif item_type == "group":
             # Select group in QGIS using service
-            group_name = item.data(0, Qt.ItemDataRole.UserRole)
+            group_name = item.data(0, ROLE_ID)
             self._updating_selection = True
             try:
                 SelectionService.select_group_in_qgis(group_name, self.iface, self.log_debug)
@@ -766,8 +834,8 @@ class LayersAdvancedDialog(QDockWidget):
         elif item_type in ["category", "range", "rule"]:
             # For symbology items, select the parent layer
             parent = item.parent()
-            if parent and parent.data(0, Qt.ItemDataRole.UserRole + 1) == "layer":
-                layer_id = parent.data(0, Qt.ItemDataRole.UserRole)
+            if parent and parent.data(0, ROLE_TYPE) == "layer":
+                layer_id = parent.data(0, ROLE_ID)
                 self.layerSelected.emit(layer_id)
                 
                 # Select parent layer in QGIS using service
@@ -826,8 +894,8 @@ class LayersAdvancedDialog(QDockWidget):
             """Recursively search for layer item."""
             for i in range(parent_item.childCount()):
                 child = parent_item.child(i)
-                child_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-                child_id = child.data(0, Qt.ItemDataRole.UserRole)
+                child_type = child.data(0, ROLE_TYPE)
+                child_id = child.data(0, ROLE_ID)
                 
                 if child_type == "layer" and child_id == layer_id:
                     return child
@@ -842,8 +910,8 @@ class LayersAdvancedDialog(QDockWidget):
         # Search at top level
         for i in range(self.layer_tree.topLevelItemCount()):
             top_item = self.layer_tree.topLevelItem(i)
-            top_type = top_item.data(0, Qt.ItemDataRole.UserRole + 1)
-            top_id = top_item.data(0, Qt.ItemDataRole.UserRole)
+            top_type = top_item.data(0, ROLE_TYPE)
+            top_id = top_item.data(0, ROLE_ID)
             
             if top_type == "layer" and top_id == layer_id:
                 self.layer_tree.setCurrentItem(top_item)
@@ -870,42 +938,8 @@ class LayersAdvancedDialog(QDockWidget):
             self.toggle_selected_visibility(True)
             return
         
-        # Otherwise show all - recursively process all items
-        self._updating_visibility = True
-        self.layer_tree.itemChanged.disconnect(self.on_item_visibility_changed)
-        
-        try:
-            def show_all_recursive(parent_item):
-                """Recursively show all layers and groups."""
-                for i in range(parent_item.childCount()):
-                    item = parent_item.child(i)
-                    item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-                    item_id = item.data(0, Qt.ItemDataRole.UserRole)
-                    
-                    # Set checkbox
-                    item.setCheckState(0, Qt.CheckState.Checked)
-                    
-                    # Update visibility in QGIS
-                    if item_type == "layer":
-                        VisibilityService.set_layer_visibility(item_id, True)
-                    elif item_type == "group":
-                        project = QgsProject.instance()
-                        root = project.layerTreeRoot()
-                        group_node = root.findGroup(item_id)
-                        if group_node:
-                            LayerOperationsService.set_group_visibility_recursive(group_node, True)
-                    
-                    # Recurse into children
-                    if item.childCount() > 0:
-                        show_all_recursive(item)
-            
-            # Process top-level items
-            root = self.layer_tree.invisibleRootItem()
-            show_all_recursive(root)
-        
-        finally:
-            self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
-            self._updating_visibility = False
+        # Otherwise show everything in one bulk update
+        self.set_all_layers_visibility(True)
     
     def hide_all_layers(self):
         """Hide all layers or selected layers if any are selected."""
@@ -916,42 +950,43 @@ class LayersAdvancedDialog(QDockWidget):
             self.toggle_selected_visibility(False)
             return
         
-        # Otherwise hide all - recursively process all items
+        # Otherwise hide everything in one bulk update
+        self.set_all_layers_visibility(False)
+    
+    def set_all_layers_visibility(self, visible):
+        """
+        Set visibility for every layer and group in one pass.
+        
+        QGIS applies the change to the whole layer tree, then the widget
+        checkboxes are synced with tree signals blocked.
+        
+        Args:
+            visible: Boolean indicating visibility state
+        """
         self._updating_visibility = True
-        self.layer_tree.itemChanged.disconnect(self.on_item_visibility_changed)
+        signals_were_blocked = self.layer_tree.blockSignals(True)
+        updates_were_enabled = self.layer_tree.updatesEnabled()
+        self.layer_tree.setUpdatesEnabled(False)
         
         try:
-            def hide_all_recursive(parent_item):
-                """Recursively hide all layers and groups."""
+            QgsProject.instance().layerTreeRoot().setItemVisibilityCheckedRecursive(visible)
+            
+            check_state = Qt.CheckState.Checked if visible else Qt.CheckState.Unchecked
+            stack = [self.layer_tree.invisibleRootItem()]
+            while stack:
+                parent_item = stack.pop()
                 for i in range(parent_item.childCount()):
                     item = parent_item.child(i)
-                    item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-                    item_id = item.data(0, Qt.ItemDataRole.UserRole)
-                    
-                    # Set checkbox
-                    item.setCheckState(0, Qt.CheckState.Unchecked)
-                    
-                    # Update visibility in QGIS
-                    if item_type == "layer":
-                        VisibilityService.set_layer_visibility(item_id, False)
-                    elif item_type == "group":
-                        project = QgsProject.instance()
-                        root = project.layerTreeRoot()
-                        group_node = root.findGroup(item_id)
-                        if group_node:
-                            LayerOperationsService.set_group_visibility_recursive(group_node, False)
-                    
-                    # Recurse into children
-                    if item.childCount() > 0:
-                        hide_all_recursive(item)
-            
-            # Process top-level items
-            root = self.layer_tree.invisibleRootItem()
-            hide_all_recursive(root)
+                    if item.data(0, ROLE_TYPE) in ("layer", "group"):
+                        item.setCheckState(0, check_state)
+                        stack.append(item)
         
         finally:
-            self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
+            # Restore the previous states so an outer batch keeps control
+            self.layer_tree.setUpdatesEnabled(updates_were_enabled)
+            self.layer_tree.blockSignals(signals_were_blocked)
             self._updating_visibility = False
+            self.iface.mapCanvas().refresh()
     
     def toggle_selected_visibility(self, visible):
         """Toggle visibility for all selected items."""
@@ -959,31 +994,39 @@ class LayersAdvancedDialog(QDockWidget):
         if not selected_items:
             return
         
-        self.layer_tree.itemChanged.disconnect(self.on_item_visibility_changed)
+        self.layer_tree.itemChanged.disconnect(self._visibility_slot)
         
         try:
+            root = QgsProject.instance().layerTreeRoot()
+            layer_ids = []
             for item in selected_items:
-                item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-                item_id = item.data(0, Qt.ItemDataRole.UserRole)
+                item_type = item.data(0, ROLE_TYPE)
+                item_id = item.data(0, ROLE_ID)
                 
                 # Set checkbox state
                 item.setCheckState(0, Qt.CheckState.Checked if visible else Qt.CheckState.Unchecked)
                 
                 # Update actual layer/group visibility
                 if item_type == "layer":
-                    VisibilityService.set_layer_visibility(item_id, visible)
-                    # Emit signal to notify other components
-                    self.layerVisibilityChanged.emit(item_id, visible)
+                    layer_ids.append(item_id)
                 elif item_type == "group":
                     # Get the QGIS group node and set visibility recursively
-                    project = QgsProject.instance()
-                    root = project.layerTreeRoot()
                     group_node = root.findGroup(item_id)
                     if group_node:
                         LayerOperationsService.set_group_visibility_recursive(group_node, visible)
+            
+            # Apply all selected layers with the canvas frozen, so it
+            # repaints once instead of once per layer
+            if layer_ids:
+                VisibilityService.set_multiple_layers_visibility(
+                    layer_ids, visible, canvas=self.iface.mapCanvas()
+                )
+                # Emit signal to notify other components
+                for layer_id in layer_ids:
+                    self.layerVisibilityChanged.emit(layer_id, visible)
         
         finally:
-            self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
+            self.layer_tree.itemChanged.connect(self._visibility_slot)
     
     def show_context_menu(self, position):
         """Show context menu for layer or group operations."""
@@ -999,9 +1042,9 @@ class LayersAdvancedDialog(QDockWidget):
             project = QgsProject.instance()
             
             for sel_item in selected_items:
-                sel_item_type = sel_item.data(0, Qt.ItemDataRole.UserRole + 1)
+                sel_item_type = sel_item.data(0, ROLE_TYPE)
                 if sel_item_type == "layer":
-                    layer_id = sel_item.data(0, Qt.ItemDataRole.UserRole)
+                    layer_id = sel_item.data(0, ROLE_ID)
                     layer = project.mapLayer(layer_id)
                     if layer:
                         layers.append(layer)
@@ -1014,39 +1057,39 @@ class LayersAdvancedDialog(QDockWidget):
                 self.refresh_layers()
                 return
         
-        item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
+        item_type = item.data(0, ROLE_TYPE)
         
         if item_type == "layer":
             # Layer context menu
-            layer_id = item.data(0, Qt.ItemDataRole.UserRole)
+            layer_id = item.data(0, ROLE_ID)
             project = QgsProject.instance()
             layer = project.mapLayer(layer_id)
             
             if not layer:
                 return
             
-            # Create menu and pass rename callback
-            menu = LayerContextMenu.create_layer_menu(
-                layer, 
-                self.iface,
-                rename_callback=lambda: self.start_rename_item(item),
-                debug_callback=self.log_debug
+            # Reuse one prebuilt layer menu, retargeted to this layer
+            if self._layer_menu is None:
+                self._layer_menu = LayerContextMenu(self.iface, debug_callback=self.log_debug, parent=self)
+            self._layer_menu.popup_for(
+                layer,
+                self.layer_tree.viewport().mapToGlobal(position),
+                rename_callback=lambda it=item: self.start_rename_item(it)
             )
-            menu.exec_(self.layer_tree.viewport().mapToGlobal(position))
         
         elif item_type == "group":
             # Group context menu
             menu = QMenu(self)
             
-            rename_action = menu.addAction(QIcon(":/images/themes/default/mActionEditTable.svg"), "Rename Group\\tF2")
-            rename_action.triggered.connect(lambda: self.start_rename_item(item))
+            rename_action = menu.addAction(resource_icon(":/images/themes/default/mActionEditTable.svg"), "Rename Group\\tF2")
+            rename_action.triggered.connect(lambda checked, it=item: self.start_rename_item(it))
             
             menu.addSeparator()
             
             # Remove group
-            group_name = item.data(0, Qt.ItemDataRole.UserRole)
-            remove_action = menu.addAction(QIcon(":/images/themes/default/mActionRemoveLayer.svg"), "Remove Group")
-            remove_action.triggered.connect(lambda: self.remove_group(group_name))
+            group_name = item.data(0, ROLE_ID)
+            remove_action = menu.addAction(resource_icon(":/images/themes/default/mActionRemoveLayer.svg"), "Remove Group")
+            remove_action.triggered.connect(lambda checked, name=group_name: self.remove_group(name))
             
             menu.exec_(self.layer_tree.viewport().mapToGlobal(position))
     
@@ -1090,7 +1133,7 @@ class LayersAdvancedDialog(QDockWidget):
                 selected_items = self.layer_tree.selectedItems()
                 if selected_items:
                     item = selected_items[0]
-                    item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
+                    item_type = item.data(0, ROLE_TYPE)
                     # Edit both layers and groups
                     if item_type in ["layer", "group"]:
                         self.start_rename_item(item)
@@ -1117,23 +1160,16 @@ class LayersAdvancedDialog(QDockWidget):
     
     def on_item_name_changed(self, item, column):
         """Handle layer or group name change after inline editing."""
-        # Disconnect this handler first to avoid recursion
-        try:
-            self.layer_tree.itemChanged.disconnect(self.on_item_name_changed)
-        except TypeError:
-            # Already disconnected, ignore
-            pass
-        
         # Check if this is a name change (column 0) or visibility change
         if column == 0:
-            item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
+            item_type = item.data(0, ROLE_TYPE)
             new_name = item.text(0)
-            original_name = item.data(0, Qt.ItemDataRole.UserRole + 2)
+            original_name = item.data(0, ROLE_ORIGINAL_NAME)
+            project = QgsProject.instance()
             
             if item_type == "layer":
                 # Get the layer
-                layer_id = item.data(0, Qt.ItemDataRole.UserRole)
-                project = QgsProject.instance()
+                layer_id = item.data(0, ROLE_ID)
                 layer = project.mapLayer(layer_id)
                 
                 if layer and new_name and new_name != original_name:
@@ -1141,24 +1177,31 @@ class LayersAdvancedDialog(QDockWidget):
             
             elif item_type == "group":
                 # Get the group from layer tree by name (avoid dangling pointer)
-                old_group_name = item.data(0, Qt.ItemDataRole.UserRole)
-                root = QgsProject.instance().layerTreeRoot()
+                old_group_name = item.data(0, ROLE_ID)
+                root = project.layerTreeRoot()
                 group_node = root.findGroup(old_group_name)
                 
                 if group_node and new_name and new_name != original_name:
                     group_node.setName(new_name)
                     # Update the stored name in the item
-                    item.setData(0, Qt.ItemDataRole.UserRole, new_name)
+                    self.layer_tree.blockSignals(True)
+                    try:
+                        item.setData(0, ROLE_ID, new_name)
+                    finally:
+                        self.layer_tree.blockSignals(False)
             
-            # Remove editable flag
-            flags = item.flags()
-            item.setFlags(flags & ~Qt.ItemIsEditable)
+            # Remove editable flag and refresh the cached filter name
+            # without re-emitting itemChanged
+            self.layer_tree.blockSignals(True)
+            try:
+                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+                item.setData(0, ROLE_NAME_LOWER, item.text(0).lower())
+            finally:
+                self.layer_tree.blockSignals(False)
+            FilterService.reset_search_cache()
         else:
             # Not a name change, handle as visibility change
             self.on_item_visibility_changed(item, column)
-        
-        # Reconnect the visibility handler
-        self.layer_tree.itemChanged.connect(self.on_item_visibility_changed)
     
     def move_layer_up(self):
         """Move selected layer(s) or group(s) up in the layer order."""
@@ -1171,8 +1214,8 @@ class LayersAdvancedDialog(QDockWidget):
         items_to_reselect = []
         
         for item in selected_items:
-            item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-            item_id = item.data(0, Qt.ItemDataRole.UserRole)
+            item_type = item.data(0, ROLE_TYPE)
+            item_id = item.data(0, ROLE_ID)
             
             success = False
             if item_type == "layer":
@@ -1200,8 +1243,8 @@ class LayersAdvancedDialog(QDockWidget):
         items_to_reselect = []
         
         for item in reversed(selected_items):
-            item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-            item_id = item.data(0, Qt.ItemDataRole.UserRole)
+            item_type = item.data(0, ROLE_TYPE)
+            item_id = item.data(0, ROLE_ID)
             
             success = False
             if item_type == "layer":
@@ -1233,8 +1276,8 @@ class LayersAdvancedDialog(QDockWidget):
             """Recursively search for the item."""
             for i in range(parent_item.childCount()):
                 child = parent_item.child(i)
-                child_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-                child_id = child.data(0, Qt.ItemDataRole.UserRole)
+                child_type = child.data(0, ROLE_TYPE)
+                child_id = child.data(0, ROLE_ID)
                 
                 # Check if this is the item we're looking for
                 if child_type == item_type and child_id == item_id:
@@ -1284,6 +1327,12 @@ class LayersAdvancedDialog(QDockWidget):
         # Save column visibility before closing
         self.save_column_visibility()
         
+        # Drop any filter still waiting on the debounce timer
+        self._filter_timer.stop()
+        
+        # Release the source stat worker threads
+        LayerTreeBuilder.shutdown_stat_pool()
+        
         # Disconnect signals
         try:
             # Disconnect tree widget signals
@@ -1346,24 +1395,16 @@ class LayersAdvancedDialog(QDockWidget):
     
     def toggle_all_layers(self):
         """Toggle between expanding and collapsing all layers based on first layer's state."""
-        # Find the first layer item to check its state
-        def find_first_layer(item):
-            """Recursively find the first layer item."""
-            for i in range(item.childCount()):
-                child = item.child(i)
-                item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-                
-                if item_type == "layer":
-                    return child
-                elif item_type == "group":
-                    # Search within group
-                    result = find_first_layer(child)
-                    if result:
-                        return result
-            return None
-        
-        root = self.layer_tree.invisibleRootItem()
-        first_layer = find_first_layer(root)
+        # Find the first layer item to check its state; the iterator walks
+        # the tree in display order, so the first layer it reaches is it
+        first_layer = None
+        iterator = QTreeWidgetItemIterator(self.layer_tree)
+        while iterator.value():
+            item = iterator.value()
+            if item.data(0, ROLE_TYPE) == "layer":
+                first_layer = item
+                break
+            iterator += 1
         
         if first_layer:
             # Check if first layer is expanded
@@ -1394,7 +1435,7 @@ class LayersAdvancedDialog(QDockWidget):
             """Recursively expand only layer items."""
             for i in range(item.childCount()):
                 child = item.child(i)
-                item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
+                item_type = child.data(0, ROLE_TYPE)
                 
                 if item_type == "layer":
                     # Expand the layer to show symbology
@@ -1414,7 +1455,7 @@ class LayersAdvancedDialog(QDockWidget):
             """Recursively collapse only layer items."""
             for i in range(item.childCount()):
                 child = item.child(i)
-                item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
+                item_type = child.data(0, ROLE_TYPE)
                 
                 if item_type == "layer":
                     # Collapse the layer to hide symbology
@@ -0,0 +1,22 @@
+"""
+Item data roles used by the LayersAdvanced layer tree.
+"""
+
+from qgis.PyQt.QtCore import Qt
+
+
+# Layer ID, or group name for group items
+ROLE_ID = int(Qt.ItemDataRole.UserRole)
+
+# Item type ("layer", "group", "category", "rule", "raster_palette", ...)
+ROLE_TYPE = ROLE_ID + 1
+
+# Rule key for rule items; category, range or raster class index for
+# categorized, graduated and raster palette/discrete items
+ROLE_KEY = ROLE_ID + 2
+
+# Lowercased layer/group name, cached at build time for the search filter
+ROLE_NAME_LOWER = ROLE_ID + 3
+
+# Name of a layer/group before an in-place rename started
+ROLE_ORIGINAL_NAME = ROLE_ID + 4
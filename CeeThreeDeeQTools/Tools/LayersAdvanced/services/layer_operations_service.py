@@ -218,7 +218,9 @@ class LayerOperationsService:
             else:
                 target_node = root
             
-            # Move each layer to the target group
+            # Clone each layer node, keeping the originals for removal
+            moved_nodes = []
+            cloned_nodes = []
             for layer_id in layer_ids:
                 layer = project.mapLayer(layer_id)
                 if not layer:
@@ -229,13 +231,17 @@ class LayerOperationsService:
                 if not layer_node:
                     continue
                 
-                # Clone the layer node
-                cloned_node = layer_node.clone()
-                
-                # Add to target group
-                target_node.addChildNode(cloned_node)
-                
-                # Remove from old location
+                moved_nodes.append(layer_node)
+                cloned_nodes.append(layer_node.clone())
+            
+            if not cloned_nodes:
+                return True
+            
+            # Add all clones to the target group in one insertion
+            target_node.insertChildNodes(-1, cloned_nodes)
+            
+            # Remove from old locations
+            for layer_node in moved_nodes:
                 parent = layer_node.parent()
                 if parent:
                     parent.removeChildNode(layer_node)
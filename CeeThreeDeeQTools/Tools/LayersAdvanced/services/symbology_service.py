@@ -2,6 +2,11 @@
 Service for handling layer symbology visibility updates.
 """
 
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from qgis.PyQt.QtCore import Qt
 from qgis.core import (
     QgsProject,
     QgsVectorLayer,
@@ -10,27 +15,47 @@ from qgis.core import (
     QgsRuleBasedRenderer
 )
 
+from ..roles import ROLE_ID, ROLE_TYPE, ROLE_KEY
+
+
+@dataclass
+class UpdateResult:
+    """Outcome of a symbology visibility update."""
+    
+    success: bool
+    layer: Optional[QgsVectorLayer] = None
+    reason: str = ""
+
 
 class SymbologyService:
     """Handles symbology visibility updates for categorized, graduated, and rule-based renderers."""
     
+    # Cached {layer_id: {rule_key: rule}} for rule-based renderers
+    _rule_cache = {}
+    # Layer IDs whose rendererChanged signal already invalidates the rule cache
+    _rule_cache_layers = set()
+    
     @staticmethod
     def update_category_visibility(layer_id, category_index, visible, iface):
         """Update visibility of a categorized symbol category."""
         try:
-            project = QgsProject.instance()
-            layer = project.mapLayer(layer_id)
+            layer = QgsProject.instance().mapLayer(layer_id)
             
             if not layer or not isinstance(layer, QgsVectorLayer):
-                return False, None
+                return UpdateResult(False, reason="Layer is not a vector layer")
             
             renderer = layer.renderer()
             if not isinstance(renderer, QgsCategorizedSymbolRenderer):
-                return False, None
+                return UpdateResult(False, layer, "Renderer is not categorized")
             
             # Validate index
-            if category_index < 0 or category_index >= len(renderer.categories()):
-                return False, None
+            categories = renderer.categories()
+            if category_index < 0 or category_index >= len(categories):
+                return UpdateResult(False, layer, "Category index out of range")
+            
+            # Nothing to do if the category is already in the requested state
+            if categories[category_index].renderState() == visible:
+                return UpdateResult(True, layer)
             
             # Update the render state
             renderer.updateCategoryRenderState(category_index, visible)
@@ -40,28 +65,32 @@ class SymbologyService:
             iface.layerTreeView().refreshLayerSymbology(layer.id())
             layer.emitStyleChanged()
             
-            return True, layer
+            return UpdateResult(True, layer)
             
-        except Exception:
-            return False, None
+        except Exception as e:
+            return UpdateResult(False, reason=f"Error updating category visibility: {e}")
     
     @staticmethod
     def update_range_visibility(layer_id, range_index, visible, iface):
         """Update visibility of a graduated symbol range."""
         try:
-            project = QgsProject.instance()
-            layer = project.mapLayer(layer_id)
+            layer = QgsProject.instance().mapLayer(layer_id)
             
             if not layer or not isinstance(layer, QgsVectorLayer):
-                return False, None
+                return UpdateResult(False, reason="Layer is not a vector layer")
             
             renderer = layer.renderer()
             if not isinstance(renderer, QgsGraduatedSymbolRenderer):
-                return False, None
+                return UpdateResult(False, layer, "Renderer is not graduated")
             
             # Validate index
-            if range_index < 0 or range_index >= len(renderer.ranges()):
-                return False, None
+            ranges = renderer.ranges()
+            if range_index < 0 or range_index >= len(ranges):
+                return UpdateResult(False, layer, "Range index out of range")
+            
+            # Nothing to do if the range is already in the requested state
+            if ranges[range_index].renderState() == visible:
+                return UpdateResult(True, layer)
             
             # Update the render state
             renderer.updateRangeRenderState(range_index, visible)
@@ -71,30 +100,32 @@ class SymbologyService:
             iface.layerTreeView().refreshLayerSymbology(layer.id())
             layer.emitStyleChanged()
             
-            return True, layer
+            return UpdateResult(True, layer)
             
-        except Exception:
-            return False, None
+        except Exception as e:
+            return UpdateResult(False, reason=f"Error updating range visibility: {e}")
     
     @staticmethod
     def update_rule_visibility(layer_id, rule_key, visible, iface):
         """Update visibility of a rule-based renderer rule."""
         try:
-            project = QgsProject.instance()
-            layer = project.mapLayer(layer_id)
+            layer = QgsProject.instance().mapLayer(layer_id)
             
             if not layer or not isinstance(layer, QgsVectorLayer):
-                return False, None
+                return UpdateResult(False, reason="Layer is not a vector layer")
             
             renderer = layer.renderer()
             if not isinstance(renderer, QgsRuleBasedRenderer):
-                return False, None
+                return UpdateResult(False, layer, "Renderer is not rule-based")
             
             # Find and update the rule
-            root_rule = renderer.rootRule()
-            rule = root_rule.findRuleByKey(rule_key)
+            rule = SymbologyService._get_rule(layer, renderer, rule_key)
             if not rule:
-                return False, None
+                return UpdateResult(False, layer, "Rule not found")
+            
+            # Nothing to do if the rule is already in the requested state
+            if rule.active() == visible:
+                return UpdateResult(True, layer)
             
             rule.setActive(visible)
             
@@ -103,16 +134,67 @@ class SymbologyService:
             iface.layerTreeView().refreshLayerSymbology(layer.id())
             layer.emitStyleChanged()
             
-            return True, layer
+            return UpdateResult(True, layer)
                     
-        except Exception:
-            return False, None
+        except Exception as e:
+            return UpdateResult(False, reason=f"Error updating rule visibility: {e}")
+    
+    @classmethod
+    def _get_rule(cls, layer, renderer, rule_key):
+        """
+        Look up a rule by key using a per-layer cache of the rule tree.
+        
+        The cache is built by walking the root rule once and is dropped when
+        the layer's renderer changes or the layer is deleted.
+        
+        Args:
+            layer: QgsVectorLayer owning the renderer
+            renderer: QgsRuleBasedRenderer of the layer
+            rule_key: Key of the rule to find
+            
+        Returns:
+            QgsRuleBasedRenderer.Rule or None
+        """
+        layer_id = layer.id()
+        rules = cls._rule_cache.get(layer_id)
+        
+        if rules is None:
+            rules = {}
+            stack = [renderer.rootRule()]
+            while stack:
+                rule = stack.pop()
+                rules[rule.ruleKey()] = rule
+                stack.extend(rule.children())
+            cls._rule_cache[layer_id] = rules
+            
+            if layer_id not in cls._rule_cache_layers:
+                cls._rule_cache_layers.add(layer_id)
+                layer.rendererChanged.connect(
+                    lambda lid=layer_id: cls._rule_cache.pop(lid, None)
+                )
+                layer.willBeDeleted.connect(
+                    lambda lid=layer_id: cls._forget_layer(lid)
+                )
+        
+        return rules.get(rule_key)
+    
+    @classmethod
+    def _forget_layer(cls, layer_id):
+        """
+        Drop the cached rules of a deleted layer.
+        
+        Removing the ID from _rule_cache_layers too means a later layer
+        reusing the ID gets its own signal connections.
+        
+        Args:
+            layer_id: ID of the layer being deleted
+        """
+        cls._rule_cache.pop(layer_id, None)
+        cls._rule_cache_layers.discard(layer_id)
     
     @staticmethod
     def update_symbology_checkboxes_for_layer(layer, tree_widget):
         """Update symbology checkbox states for a specific layer without rebuilding the tree."""
-        from qgis.PyQt.QtCore import Qt
-        
         try:
             # Find the tree item for this layer
             layer_item = SymbologyService._find_layer_item(layer.id(), tree_widget)
@@ -124,10 +206,10 @@ class SymbologyService:
             renderer = layer.renderer()
             
             if isinstance(renderer, QgsCategorizedSymbolRenderer):
-                SymbologyService._update_category_checkboxes(layer_item, renderer)
+                SymbologyService._update_category_checkboxes(layer_item, renderer, tree_widget)
             
             elif isinstance(renderer, QgsGraduatedSymbolRenderer):
-                SymbologyService._update_range_checkboxes(layer_item, renderer)
+                SymbologyService._update_range_checkboxes(layer_item, renderer, tree_widget)
             
             elif isinstance(renderer, QgsRuleBasedRenderer):
                 # Rule-based renderers need full refresh
@@ -141,51 +223,88 @@ class SymbologyService:
     @staticmethod
     def _find_layer_item(layer_id, tree_widget):
         """Find the tree widget item for a given layer ID."""
-        from qgis.PyQt.QtCore import Qt
-        
         root = tree_widget.invisibleRootItem()
         for i in range(root.childCount()):
             item = root.child(i)
-            if item.data(0, Qt.ItemDataRole.UserRole + 1) == "layer":
-                if item.data(0, Qt.ItemDataRole.UserRole) == layer_id:
+            if item.data(0, ROLE_TYPE) == "layer":
+                if item.data(0, ROLE_ID) == layer_id:
                     return item
             # Check group children
-            elif item.data(0, Qt.ItemDataRole.UserRole + 1) == "group":
+            elif item.data(0, ROLE_TYPE) == "group":
                 for j in range(item.childCount()):
                     child = item.child(j)
-                    if child.data(0, Qt.ItemDataRole.UserRole + 1) == "layer":
-                        if child.data(0, Qt.ItemDataRole.UserRole) == layer_id:
+                    if child.data(0, ROLE_TYPE) == "layer":
+                        if child.data(0, ROLE_ID) == layer_id:
                             return child
         return None
     
     @staticmethod
-    def _update_category_checkboxes(layer_item, renderer):
+    def _update_category_checkboxes(layer_item, renderer, tree_widget):
         """Update checkbox states for categorized renderer."""
-        from qgis.PyQt.QtCore import Qt
-        
-        categories = renderer.categories()
-        for i in range(layer_item.childCount()):
-            child = layer_item.child(i)
-            if child.data(0, Qt.ItemDataRole.UserRole + 1) == "category":
-                category_index = child.data(0, Qt.ItemDataRole.UserRole + 2)
-                if 0 <= category_index < len(categories):
-                    category = categories[category_index]
-                    new_state = Qt.CheckState.Checked if category.renderState() else Qt.CheckState.Unchecked
-                    if child.checkState(0) != new_state:
-                        child.setCheckState(0, new_state)
+        SymbologyService._sync_render_state_checkboxes(
+            layer_item, renderer.categories(), "category", tree_widget
+        )
     
     @staticmethod
-    def _update_range_checkboxes(layer_item, renderer):
+    def _update_range_checkboxes(layer_item, renderer, tree_widget):
         """Update checkbox states for graduated renderer."""
-        from qgis.PyQt.QtCore import Qt
+        SymbologyService._sync_render_state_checkboxes(
+            layer_item, renderer.ranges(), "range", tree_widget
+        )
+    
+    @staticmethod
+    def _sync_render_state_checkboxes(layer_item, renderer_items, item_type, tree_widget):
+        """
+        Sync child checkboxes with the render state of categories or ranges.
         
-        ranges = renderer.ranges()
+        Render states and current checkbox states are packed into uint8 arrays
+        so only the children whose state actually differs are written back.
+        Tree widget signals and repaints are suspended while writing so the
+        sync does not emit itemChanged or repaint once per child.
+        
+        Args:
+            layer_item: The layer QTreeWidgetItem holding the symbology children
+            renderer_items: List of QgsRendererCategory or QgsRendererRange
+            item_type: "category" or "range"
+            tree_widget: QTreeWidget owning the items
+        """
+        # Collect (child, renderer index) pairs for valid symbology children;
+        # each child carries its renderer index in ROLE_KEY
+        item_count = len(renderer_items)
+        children = []
+        indexes = []
         for i in range(layer_item.childCount()):
             child = layer_item.child(i)
-            if child.data(0, Qt.ItemDataRole.UserRole + 1) == "range":
-                range_index = child.data(0, Qt.ItemDataRole.UserRole + 2)
-                if 0 <= range_index < len(ranges):
-                    range_item = ranges[range_index]
-                    new_state = Qt.CheckState.Checked if range_item.renderState() else Qt.CheckState.Unchecked
-                    if child.checkState(0) != new_state:
-                        child.setCheckState(0, new_state)
+            if child.data(0, ROLE_TYPE) == item_type:
+                index = child.data(0, ROLE_KEY)
+                if index is not None and 0 <= index < item_count:
+                    children.append(child)
+                    indexes.append(index)
+        
+        if not children:
+            return
+        
+        render_states = np.fromiter(
+            (renderer_items[index].renderState() for index in indexes),
+            dtype=np.uint8, count=len(indexes)
+        )
+        current_states = np.fromiter(
+            (child.checkState(0) == Qt.CheckState.Checked for child in children),
+            dtype=np.uint8, count=len(children)
+        )
+        
+        mismatched = np.nonzero(render_states ^ current_states)[0]
+        if not len(mismatched):
+            return
+        
+        # Only touch children whose checkbox disagrees with the renderer
+        was_blocked = tree_widget.blockSignals(True)
+        updates_were_enabled = tree_widget.updatesEnabled()
+        tree_widget.setUpdatesEnabled(False)
+        try:
+            for i in mismatched:
+                new_state = Qt.CheckState.Checked if render_states[i] else Qt.CheckState.Unchecked
+                children[i].setCheckState(0, new_state)
+        finally:
+            tree_widget.setUpdatesEnabled(updates_were_enabled)
+            tree_widget.blockSignals(was_blocked)
@@ -2,69 +2,122 @@
 Service for handling layer tree reordering operations including drag-and-drop.
 """
 
+from collections import deque
+
 from qgis.core import (
     QgsProject,
     QgsLayerTreeGroup
 )
-from qgis.PyQt.QtCore import Qt
+
+from ..roles import ROLE_ID, ROLE_TYPE
 
 
 class TreeReorderingService:
     """Static service for applying tree reordering from widget to QGIS layer tree."""
     
     @staticmethod
-    def apply_tree_reordering(layer_tree_widget, root_node):
+    def apply_tree_reordering(layer_tree_widget, root_node, canvases=None):
         """
         Apply the visual tree reordering to the actual QGIS layer tree.
         
+        Map canvases are frozen for the whole batch so they render once at
+        the end instead of after every clone-insert-remove step.
+        
         Args:
             layer_tree_widget: The QTreeWidget with the desired structure
             root_node: The QGIS layer tree root node
+            canvases: Optional list of QgsMapCanvas to suspend during the update
         """
-        TreeReorderingService._apply_tree_structure(
-            layer_tree_widget.invisibleRootItem(),
-            root_node
-        )
+        canvases = list(canvases) if canvases else []
+        for canvas in canvases:
+            canvas.setRenderFlag(False)
+            canvas.freeze(True)
+        
+        try:
+            TreeReorderingService._apply_tree_structure(
+                layer_tree_widget.invisibleRootItem(),
+                root_node
+            )
+        finally:
+            for canvas in canvases:
+                canvas.freeze(False)
+                canvas.setRenderFlag(True)
+                canvas.refresh()
     
     @staticmethod
-    def _apply_tree_structure(widget_parent, qgis_parent):
+    def _apply_tree_structure(widget_root, qgis_root):
         """
-        Recursively apply tree structure from widget to QGIS layer tree.
+        Apply tree structure from widget to QGIS layer tree.
         Uses the same clone-insert-remove pattern as move_layer_up/down.
         
+        Group levels are collected breadth-first with a deque and then
+        reordered deepest-first, so every group is settled before its parent
+        level moves it (the same bottom-up order as a recursive walk).
+        
         Args:
-            widget_parent: Parent tree widget item
-            qgis_parent: Parent QGIS layer tree node
+            widget_root: Root tree widget item
+            qgis_root: Root QGIS layer tree node
+        """
+        root = QgsProject.instance().layerTreeRoot()
+        
+        # Collect (group name, widget structure) for every level, top-down
+        levels = []
+        queue = deque([(widget_root, None)])
+        while queue:
+            widget_parent, group_name = queue.popleft()
+            widget_structure = TreeReorderingService._collect_widget_structure(widget_parent)
+            if not widget_structure:
+                continue
+            
+            levels.append((group_name, widget_structure))
+            for item_type, item_id, widget_child in widget_structure:
+                if item_type == "group":
+                    queue.append((widget_child, item_id))
+        
+        # Reverse breadth-first order processes child groups before their parents
+        for group_name, widget_structure in reversed(levels):
+            if group_name is None:
+                qgis_parent = qgis_root
+            else:
+                qgis_parent = root.findGroup(group_name)
+                if not qgis_parent or not isinstance(qgis_parent, QgsLayerTreeGroup):
+                    continue
+            
+            TreeReorderingService._reorder_level(root, qgis_parent, widget_structure)
+    
+    @staticmethod
+    def _collect_widget_structure(widget_parent):
         """
-        project = QgsProject.instance()
-        root = project.layerTreeRoot()
+        Collect the layers and groups directly under a widget item.
         
-        # Collect widget structure at this level (only layers and groups, skip symbology items)
+        Args:
+            widget_parent: Parent tree widget item
+            
+        Returns:
+            List of (item_type, item_id, widget_child) tuples
+        """
+        # Only layers and groups are actual QGIS tree nodes, skip symbology items
         widget_structure = []
         for i in range(widget_parent.childCount()):
             child = widget_parent.child(i)
-            item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-            item_id = child.data(0, Qt.ItemDataRole.UserRole)
+            item_type = child.data(0, ROLE_TYPE)
             
-            # Only process actual QGIS tree nodes (layers and groups), skip symbology items
-            if item_type == "layer":
-                widget_structure.append(("layer", item_id, child))
-            elif item_type == "group":
-                widget_structure.append(("group", item_id, child))
-            elif item_type in ("category", "range", "rule"):
-                pass  # Skip symbology items silently
-        
-        if not widget_structure:
-            return
+            if item_type in ("layer", "group"):
+                widget_structure.append((item_type, child.data(0, ROLE_ID), child))
         
-        # FIRST: Recursively process all group children (bottom-up approach)
-        for item_type, item_id, widget_child in widget_structure:
-            if item_type == "group":
-                group_node = root.findGroup(item_id)
-                if group_node and isinstance(group_node, QgsLayerTreeGroup):
-                    TreeReorderingService._apply_tree_structure(widget_child, group_node)
+        return widget_structure
+    
+    @staticmethod
+    def _reorder_level(root, qgis_parent, widget_structure):
+        """
+        Reorder the children of a QGIS node to match one widget level.
         
-        # NOW: Reorder nodes at this level using the proven clone-insert-remove pattern
+        Args:
+            root: QGIS layer tree root (used for node lookups)
+            qgis_parent: QGIS layer tree node whose children are reordered
+            widget_structure: List of (item_type, item_id, widget_child) tuples
+        """
+        # Reorder nodes at this level using the proven clone-insert-remove pattern
         # Process in reverse order to avoid index shifting issues
         desired_nodes = []
         for item_type, item_id, widget_child in widget_structure:
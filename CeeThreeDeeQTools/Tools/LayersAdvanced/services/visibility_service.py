@@ -1,47 +1,96 @@
 """Service for managing layer visibility."""
 
-from qgis.core import QgsProject, QgsMapLayer
+from qgis.core import Qgis, QgsProject, QgsMapLayer, QgsMessageLog
 
 
 class VisibilityService:
     """Handles layer visibility operations."""
     
+    # Cached {layer_id: QgsLayerTreeLayer} lookup, cleared whenever the tree changes
+    _layer_index = {}
+    _index_root = None
+    
+    @classmethod
+    def _init_index(cls, project):
+        """
+        Hook the layer index to the project's layer tree structure signals.
+        
+        Args:
+            project: QgsProject whose layer tree root should be indexed
+        """
+        root = project.layerTreeRoot()
+        root.addedChildren.connect(cls._invalidate_index)
+        root.removedChildren.connect(cls._invalidate_index)
+        cls._index_root = root
+        cls._layer_index.clear()
+    
+    @classmethod
+    def _invalidate_index(cls, *args):
+        """Drop cached layer tree nodes after the tree structure changed."""
+        cls._layer_index.clear()
+    
+    @classmethod
+    def _find_layer_node(cls, layer_id):
+        """
+        Find the layer tree node for a layer ID using the cached index.
+        
+        Args:
+            layer_id: ID of the layer to look up
+            
+        Returns:
+            QgsLayerTreeLayer or None
+        """
+        if cls._index_root is None:
+            cls._init_index(QgsProject.instance())
+        
+        node = cls._layer_index.get(layer_id)
+        if node is None:
+            node = cls._index_root.findLayer(layer_id)
+            if node:
+                cls._layer_index[layer_id] = node
+        return node
+    
     @staticmethod
     def is_layer_visible(layer: QgsMapLayer) -> bool:
         """Check if a layer is currently visible in the map canvas."""
-        try:
-            project = QgsProject.instance()
-            root = project.layerTreeRoot()
-            layer_tree_layer = root.findLayer(layer.id())
-            
-            if layer_tree_layer:
-                return layer_tree_layer.isVisible()
-        except Exception:
-            pass
-        
-        return False
+        layer_tree_layer = VisibilityService._find_layer_node(layer.id())
+        return layer_tree_layer.isVisible() if layer_tree_layer else False
     
     @staticmethod
     def set_layer_visibility(layer_id: str, visible: bool):
         """Set the visibility of a layer."""
         try:
-            project = QgsProject.instance()
-            root = project.layerTreeRoot()
-            layer_tree_layer = root.findLayer(layer_id)
+            layer_tree_layer = VisibilityService._find_layer_node(layer_id)
             
             if layer_tree_layer:
                 layer_tree_layer.setItemVisibilityChecked(visible)
         except Exception as e:
-            print(f"Error setting layer visibility: {e}")
+            QgsMessageLog.logMessage(f"Error setting layer visibility: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
     @staticmethod
-    def set_multiple_layers_visibility(layer_ids: list, visible: bool):
+    def set_multiple_layers_visibility(layer_ids: list, visible: bool, canvas=None):
         """
         Set visibility for multiple layers at once.
         
+        Layer nodes come from the cached index and, when a map canvas is
+        given, it is frozen so only a single repaint happens.
+        
         Args:
             layer_ids: List of layer IDs
             visible: Boolean visibility state
+            canvas: Optional QgsMapCanvas to freeze during the update
         """
-        for layer_id in layer_ids:
-            VisibilityService.set_layer_visibility(layer_id, visible)
+        try:
+            if canvas:
+                canvas.freeze(True)
+            try:
+                for layer_id in layer_ids:
+                    layer_tree_layer = VisibilityService._find_layer_node(layer_id)
+                    if layer_tree_layer:
+                        layer_tree_layer.setItemVisibilityChecked(visible)
+            finally:
+                if canvas:
+                    canvas.freeze(False)
+                    canvas.refresh()
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Error setting layers visibility: {e}", "CeeThreeDeeQTools", Qgis.Warning)
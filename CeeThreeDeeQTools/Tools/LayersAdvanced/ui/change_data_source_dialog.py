@@ -8,9 +8,9 @@ from qgis.PyQt.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QDialogButtonBox,
     QLabel, QLineEdit, QPushButton
 )
-from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtCore import Qt, QTimer
 from qgis.gui import QgsBrowserTreeView
-from qgis.core import QgsDataItem, QgsMimeDataUtils, QgsLayerItem
+from qgis.core import Qgis, QgsDataItem, QgsMimeDataUtils, QgsLayerItem, QgsMessageLog
 
 
 class ChangeDataSourceDialog(QDialog):
@@ -34,26 +34,32 @@ class ChangeDataSourceDialog(QDialog):
         self.browser_model = browser_model
         self.debug_callback = debug_callback
         self.selected_uri = None
+        self._signals_connected = False
+        self._selection_pending = False
+        self._pending_indexes = None
+        self._debug_enabled = bool(debug_callback)
         
         self.setWindowTitle(f"Change Data Source - {layer.name()}")
         self.setModal(True)
         self.resize(800, 600)
         
-        self.log(f"DEBUG: Dialog initializing for layer: {layer.name()}")
-        self.log(f"DEBUG: Current source: {layer.source()}")
-        self.log(f"DEBUG: Browser model: {browser_model}")
+        if self._debug_enabled:
+            self.log(f"DEBUG: Dialog initializing for layer: {layer.name()}")
+            self.log(f"DEBUG: Current source: {layer.source()}")
+            self.log(f"DEBUG: Browser model: {browser_model}")
         
         self._setup_ui()
         self._connect_signals()
         
-        self.log(f"DEBUG: Dialog initialization complete")
+        if self._debug_enabled:
+            self.log(f"DEBUG: Dialog initialization complete")
     
     def log(self, message):
-        """Log a message via callback or print."""
+        """Log a message via callback or the QGIS message log."""
         if self.debug_callback:
             self.debug_callback(message)
         else:
-            print(message)
+            QgsMessageLog.logMessage(message, "CeeThreeDeeQTools", Qgis.Info)
     
     def _setup_ui(self):
         """Setup the dialog UI."""
@@ -81,96 +87,118 @@ class ChangeDataSourceDialog(QDialog):
         browser_label = QLabel("Select new data source:")
         layout.addWidget(browser_label)
         
+        # The browser model is attached once the dialog is shown, so opening the
+        # dialog never waits on the model populating (e.g. File Geodatabases)
         self.browser_tree = QgsBrowserTreeView(self)
         
-        # Set the browser model
-        self.log(f"DEBUG: Setting browser model on tree view")
-        self.browser_tree.setBrowserModel(self.browser_model)
-        
-        # Set the model to show the root
-        self.log(f"DEBUG: Browser model has {self.browser_model.rowCount()} root items")
-        
         layout.addWidget(self.browser_tree)
         
         # Dialog buttons
         self.button_box = QDialogButtonBox(
             QDialogButtonBox.Ok | QDialogButtonBox.Cancel
         )
-        self.button_box.button(QDialogButtonBox.Ok).setEnabled(False)
+        self._ok_button = self.button_box.button(QDialogButtonBox.Ok)
+        self._ok_button.setEnabled(False)
         layout.addWidget(self.button_box)
         
         self.setLayout(layout)
     
     def showEvent(self, event):
-        """Override show event to ensure signals are connected after tree is fully set up."""
+        """Override show event to attach the browser model after the dialog is visible."""
         super().showEvent(event)
         
-        # Try to connect selection signal now that dialog is shown
-        if not hasattr(self, '_signals_connected'):
-            self._signals_connected = True
-            selection_model = self.browser_tree.selectionModel()
-            if selection_model:
-                self.log("DEBUG: Connecting selection signal in showEvent")
-                selection_model.selectionChanged.connect(self._on_selection_changed)
+        if not self._signals_connected:
+            QTimer.singleShot(0, self._attach_browser_model)
     
-    def _connect_signals(self):
-        """Connect signals."""
-        # Try to connect selection model if available
+    def _attach_browser_model(self):
+        """Attach the shared browser model to the tree and connect selection signals."""
+        if self._signals_connected:
+            return
+        
+        if self._debug_enabled:
+            self.log("DEBUG: Setting browser model on tree view")
+        self.browser_tree.setBrowserModel(self.browser_model)
+        if self._debug_enabled:
+            self.log(f"DEBUG: Browser model has {self.browser_model.rowCount()} root items")
+        
         selection_model = self.browser_tree.selectionModel()
         if selection_model:
-            self.log("DEBUG: Selection model available, connecting signal")
-            selection_model.selectionChanged.connect(self._on_selection_changed)
+            selection_model.selectionChanged.connect(self._on_selection_changed, Qt.QueuedConnection)
             self._signals_connected = True
         else:
-            self.log("WARNING: No selection model available for browser tree yet")
-            self._signals_connected = False
-        
+            self.log("WARNING: No selection model available for browser tree")
+    
+    def _connect_signals(self):
+        """Connect signals."""
+        # Selection signals are connected in _attach_browser_model
         self.browser_tree.doubleClicked.connect(self._on_double_click)
         self.button_box.accepted.connect(self.accept)
         self.button_box.rejected.connect(self.reject)
     
     def _on_selection_changed(self, selected, deselected):
-        """Handle selection changes in the browser tree."""
-        indexes = self.browser_tree.selectionModel().selectedIndexes()
+        """Coalesce bursts of selection changes into one deferred update."""
+        # Keep the newly selected indexes so processing need not re-query the model
+        self._pending_indexes = None if selected.isEmpty() else selected.indexes()
+        if not self._selection_pending:
+            self._selection_pending = True
+            QTimer.singleShot(0, self._process_selection)
+    
+    def _process_selection(self):
+        """Handle the current selection in the browser tree."""
+        self._selection_pending = False
+        indexes = self._pending_indexes
+        self._pending_indexes = None
+        if not indexes:
+            # Only a deselection was reported; fall back to the full selection
+            indexes = self.browser_tree.selectionModel().selectedIndexes()
         
         if not indexes:
             self.new_source_edit.clear()
-            self.button_box.button(QDialogButtonBox.Ok).setEnabled(False)
+            self._ok_button.setEnabled(False)
             return
         
         # Get the data item from the model
         index = indexes[0]
         data_item = self.browser_model.dataItem(index)
         
-        self.log(f"DEBUG: Selected item: {data_item}")
-        self.log(f"DEBUG: Item type: {type(data_item).__name__}")
+        # Debug output is collected and logged once per selection
+        debug_lines = [] if self._debug_enabled else None
+        if debug_lines is not None:
+            debug_lines.append(f"DEBUG: Selected item: {data_item}")
+            debug_lines.append(f"DEBUG: Item type: {type(data_item).__name__}")
         
+        uri_str = None
         if isinstance(data_item, QgsLayerItem):
             # This is a layer item (e.g., a layer inside a geopackage)
-            self.log(f"DEBUG: Layer item selected")
-            self.log(f"DEBUG: Layer type: {data_item.mapLayerType()}")
-            self.log(f"DEBUG: Provider key: {data_item.providerKey()}")
+            if debug_lines is not None:
+                debug_lines.append("DEBUG: Layer item selected")
+                debug_lines.append(f"DEBUG: Layer type: {data_item.mapLayerType()}")
+                debug_lines.append(f"DEBUG: Provider key: {data_item.providerKey()}")
             
-            # Get URI from mime data
-            mime_uris = data_item.mimeUris()
-            if mime_uris:
-                uri = mime_uris[0]
-                self.log(f"DEBUG: URI: {uri.uri}")
-                self.log(f"DEBUG: URI name: {uri.name}")
-                self.log(f"DEBUG: URI provider: {uri.providerKey}")
-                
-                self.selected_uri = uri.uri
-                self.new_source_edit.setText(uri.uri)
-                self.button_box.button(QDialogButtonBox.Ok).setEnabled(True)
-            else:
-                self.log(f"DEBUG: No mime URIs available")
-                self.new_source_edit.clear()
-                self.button_box.button(QDialogButtonBox.Ok).setEnabled(False)
-        else:
+            # Read the URI straight from the layer item; only fall back to
+            # mime data for items that do not expose a meaningful uri()
+            uri_str = data_item.uri()
+            if not uri_str:
+                mime_uris = data_item.mimeUris()
+                if mime_uris:
+                    uri_str = mime_uris[0].uri
+            
+            if debug_lines is not None:
+                debug_lines.append(f"DEBUG: URI: {uri_str}" if uri_str else "DEBUG: No URI available")
+        elif debug_lines is not None:
             # Not a layer item (might be a directory, geopackage container, etc.)
-            self.log(f"DEBUG: Not a layer item, clearing selection")
+            debug_lines.append("DEBUG: Not a layer item, clearing selection")
+        
+        if uri_str:
+            self.selected_uri = uri_str
+            self.new_source_edit.setText(uri_str)
+            self._ok_button.setEnabled(True)
+        else:
             self.new_source_edit.clear()
-            self.button_box.button(QDialogButtonBox.Ok).setEnabled(False)
+            self._ok_button.setEnabled(False)
+        
+        if debug_lines:
+            self.log("\n".join(debug_lines))
     
     def _on_double_click(self, index):
         """Handle double-click in browser tree."""
@@ -178,9 +206,27 @@ class ChangeDataSourceDialog(QDialog):
         
         if isinstance(data_item, QgsLayerItem):
             # Double-clicking a layer item accepts the dialog
-            self.log(f"DEBUG: Double-clicked layer item, accepting dialog")
+            if self._debug_enabled:
+                self.log(f"DEBUG: Double-clicked layer item, accepting dialog")
             self.accept()
     
+    def done(self, result):
+        """Disconnect browser signals before closing so the dialog can be released promptly."""
+        selection_model = self.browser_tree.selectionModel()
+        if selection_model and self._signals_connected:
+            try:
+                selection_model.selectionChanged.disconnect(self._on_selection_changed)
+            except (TypeError, RuntimeError):
+                pass
+            self._signals_connected = False
+        
+        try:
+            self.browser_tree.doubleClicked.disconnect(self._on_double_click)
+        except (TypeError, RuntimeError):
+            pass
+        
+        super().done(result)
+    
     def get_selected_uri(self):
         """
         Get the selected URI.
@@ -1,107 +1,230 @@
 """Context menu for layer operations."""
 
-from qgis.PyQt.QtWidgets import QMenu, QApplication, QInputDialog
-from qgis.PyQt.QtCore import QObject, Qt
-from qgis.PyQt.QtGui import QIcon
+import os
+import traceback
+from functools import lru_cache, partial
+
+from qgis.PyQt.QtWidgets import QAction, QMenu, QApplication, QInputDialog, QFileDialog
+from qgis.PyQt.QtCore import QObject, Qt, pyqtSlot
 from qgis.core import (
-    QgsVectorLayer,
-    QgsRasterLayer,
+    Qgis,
+    QgsMapLayer,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
-    QgsProject
+    QgsProject,
+    QgsMessageLog
 )
-from qgis.gui import QgsProjectionSelectionDialog
+from qgis.gui import QgsDataSourceSelectDialog, QgsProjectionSelectionDialog
+from ..services.layer_operations_service import LayerOperationsService
 from ..services.layer_service import LayerService
 from ..services.visibility_service import VisibilityService
+from .icons import resource_icon
+
+
+# Column names shown in the header visibility menu
+COLUMN_NAMES = ("Layer Name", "Type", "Features/Size", "CRS", "File Type", "File Size", "Source")
+
+# File dialog filters for the data source fallback, by layer type
+_VECTOR_FILTER = "All Vector Files (*.shp *.gpkg *.geojson *.kml *.gml);;Shapefiles (*.shp);;GeoPackage (*.gpkg);;GeoJSON (*.geojson);;All Files (*.*)"
+_RASTER_FILTER = "All Raster Files (*.tif *.tiff *.img *.asc *.grd);;GeoTIFF (*.tif *.tiff);;All Files (*.*)"
+_ALL_FILTER = "All Files (*.*)"
+
+
+# Whether the transform cache is cleared on project CRS changes yet
+_xform_cache_connected = False
+
+
+@lru_cache(maxsize=64)
+def _cached_transform(source_authid, dest_authid):
+    """Build the transform for an authid pair; results are memoized per pair."""
+    return QgsCoordinateTransform(
+        QgsCoordinateReferenceSystem(source_authid),
+        QgsCoordinateReferenceSystem(dest_authid),
+        QgsProject.instance()
+    )
+
+
+def _clear_xform_cache(*args):
+    """Drop cached transforms when the project CRS or transform context changes."""
+    _cached_transform.cache_clear()
+
+
+def _get_transform(source_crs, dest_crs, project, source_authid=None, dest_authid=None):
+    """
+    Return a coordinate transform between two CRSs, reusing cached instances.
+    
+    Custom CRSs without an authid are not cached since their key is ambiguous.
+    
+    Args:
+        source_crs: QgsCoordinateReferenceSystem of the layer
+        dest_crs: QgsCoordinateReferenceSystem of the canvas
+        project: QgsProject supplying the transform context
+        source_authid: Optional authid of source_crs, if the caller already has it
+        dest_authid: Optional authid of dest_crs, if the caller already has it
+    
+    Returns:
+        QgsCoordinateTransform: Transform from source_crs to dest_crs
+    """
+    global _xform_cache_connected
+    if source_authid is None:
+        source_authid = source_crs.authid()
+    if dest_authid is None:
+        dest_authid = dest_crs.authid()
+    if not source_authid or not dest_authid:
+        return QgsCoordinateTransform(source_crs, dest_crs, project)
+    
+    if not _xform_cache_connected:
+        project.crsChanged.connect(_clear_xform_cache)
+        project.transformContextChanged.connect(_clear_xform_cache)
+        _xform_cache_connected = True
+    
+    return _cached_transform(source_authid, dest_authid)
+
+
+def _check_icon():
+    """Return the shared icon used to mark visible columns."""
+    return resource_icon(":/images/themes/default/mIconSelected.svg")
+
+
+class _LayerMenuActions(QObject):
+    """Slot target for layer menu actions; holds the layer the menu applies to."""
+    
+    def __init__(self, layer, iface, rename_callback=None, debug_callback=None, parent=None):
+        super().__init__(parent)
+        self.layer = layer
+        self.iface = iface
+        self.rename_callback = rename_callback
+        self.debug_callback = debug_callback
+    
+    @pyqtSlot()
+    def _on_zoom(self):
+        LayerContextMenu.zoom_to_layer(self.layer, self.iface)
+    
+    @pyqtSlot()
+    def _on_zoom_selected(self):
+        self.iface.mapCanvas().zoomToSelected(self.layer)
+    
+    @pyqtSlot()
+    def _on_open_attr(self):
+        self.iface.showAttributeTable(self.layer)
+    
+    @pyqtSlot()
+    def _on_props(self):
+        self.iface.showLayerProperties(self.layer)
+    
+    @pyqtSlot()
+    def _on_style(self):
+        LayerContextMenu.open_layer_styling_panel(self.layer, self.iface)
+    
+    @pyqtSlot()
+    def _on_toggle_edit(self):
+        if self.layer.isEditable():
+            self.layer.rollBack()
+        else:
+            self.layer.startEditing()
+    
+    @pyqtSlot()
+    def _on_duplicate(self):
+        LayerContextMenu.duplicate_layer(self.layer)
+    
+    @pyqtSlot()
+    def _on_rename(self):
+        # Rename triggers inline editing in the tree
+        if self.rename_callback:
+            self.rename_callback()
+    
+    @pyqtSlot()
+    def _on_change_source(self):
+        LayerContextMenu.change_data_source(self.layer, self.iface, self.debug_callback)
+    
+    @pyqtSlot()
+    def _on_set_crs(self):
+        LayerContextMenu.set_layer_crs(self.layer, self.iface)
+    
+    @pyqtSlot()
+    def _on_remove(self):
+        LayerContextMenu.remove_layer(self.layer)
+    
+    @pyqtSlot()
+    def _on_copy_info(self):
+        LayerContextMenu.copy_layer_info(self.layer)
+
+
+class _GroupMenuHelper(QObject):
+    """Slot target for the "Add to Group" submenu; holds the layers to move."""
+    
+    def __init__(self, layer_ids, parent=None):
+        super().__init__(parent)
+        self.layer_ids = layer_ids
+    
+    def move_to(self, group_name, checked=False):
+        # Bound through partial, so triggered(bool) arrives as checked
+        LayerOperationsService.move_layers_to_group(self.layer_ids, group_name)
 
 
 class LayerContextMenu:
-    """Handles context menu creation and actions for layers."""
+    """
+    Handles context menu creation and actions for layers.
     
-    @staticmethod
-    def create_layer_menu(layer, iface, rename_callback=None, debug_callback=None):
+    An instance keeps one prebuilt layer menu that is retargeted to the
+    clicked layer by popup_for(); the static methods remain usable on their own.
+    """
+    
+    # Projection selector shared by set_layer_crs calls, created on first use
+    _crs_dialog = None
+    
+    # QGIS Layer Styling Panel action, resolved on first use
+    _style_dock_action = None
+    
+    def __init__(self, iface, debug_callback=None, parent=None):
         """
-        Create context menu for a layer with all standard actions.
+        Build the reusable layer menu.
         
         Args:
-            layer: QgsMapLayer object
             iface: QgisInterface instance
-            rename_callback: Optional callback for rename action
             debug_callback: Optional callback for debug logging
-        
-        Returns:
-            QMenu: The created menu
+            parent: Optional parent widget for the menu
         """
-        menu = QMenu()
-        
-        # Zoom to layer
-        zoom_action = menu.addAction(QIcon(":/images/themes/default/mActionZoomToLayer.svg"), "Zoom to Layer")
-        zoom_action.triggered.connect(lambda: LayerContextMenu.zoom_to_layer(layer, iface))
-        
-        # Zoom to selected features (for vector layers)
-        if isinstance(layer, QgsVectorLayer) and layer.selectedFeatureCount() > 0:
-            zoom_selected_action = menu.addAction(QIcon(":/images/themes/default/mActionZoomToSelected.svg"), "Zoom to Selected")
-            zoom_selected_action.triggered.connect(lambda: iface.mapCanvas().zoomToSelected(layer))
-        
-        menu.addSeparator()
-        
-        # Show attribute table (for vector layers)
-        if isinstance(layer, QgsVectorLayer):
-            attr_table_action = menu.addAction(QIcon(":/images/themes/default/mActionOpenTable.svg"), "Open Attribute Table")
-            attr_table_action.triggered.connect(lambda: iface.showAttributeTable(layer))
-        
-        # Show properties
-        props_action = menu.addAction(QIcon(":/images/themes/default/mActionOptions.svg"), "Properties...")
-        props_action.triggered.connect(lambda: iface.showLayerProperties(layer))
-        
-        # Layer styling panel
-        style_action = menu.addAction(QIcon(":/images/themes/default/mActionStyleManager.svg"), "Edit Layer Style")
-        style_action.triggered.connect(lambda: LayerContextMenu.open_layer_styling_panel(layer, iface))
-        
-        menu.addSeparator()
-        
-        # Toggle editing (for vector layers)
-        if isinstance(layer, QgsVectorLayer):
-            if layer.isEditable():
-                toggle_edit_action = menu.addAction(QIcon(":/images/themes/default/mActionToggleEditing.svg"), "Toggle Editing (On)")
-                toggle_edit_action.triggered.connect(lambda: layer.rollBack())
-            else:
-                toggle_edit_action = menu.addAction(QIcon(":/images/themes/default/mActionToggleEditing.svg"), "Toggle Editing")
-                toggle_edit_action.triggered.connect(lambda: layer.startEditing())
-            menu.addSeparator()
-        
-        # Duplicate layer
-        duplicate_action = menu.addAction(QIcon(":/images/themes/default/mActionDuplicateLayer.svg"), "Duplicate Layer")
-        duplicate_action.triggered.connect(lambda: LayerContextMenu.duplicate_layer(layer))
-        
-        # Rename layer (triggers inline editing)
-        rename_action = menu.addAction(QIcon(":/images/themes/default/mActionEditableEdits.svg"), "Rename Layer\tF2")
-        if rename_callback:
-            rename_action.triggered.connect(rename_callback)
-        
-        menu.addSeparator()
-        
-        # Change Data Source
-        change_source_action = menu.addAction(QIcon(":/images/themes/default/mActionChangeLabelProperties.svg"), "Change Data Source...")
-        change_source_action.triggered.connect(lambda: LayerContextMenu.change_data_source(layer, iface, debug_callback))
-        
-        # Set layer CRS
-        set_crs_action = menu.addAction(QIcon(":/images/themes/default/mActionSetProjection.svg"), "Set Layer CRS...")
-        set_crs_action.triggered.connect(lambda: LayerContextMenu.set_layer_crs(layer, iface))
-        
-        menu.addSeparator()
-        
-        # Remove layer
-        remove_action = menu.addAction(QIcon(":/images/themes/default/mActionRemoveLayer.svg"), "Remove Layer")
-        remove_action.triggered.connect(lambda: LayerContextMenu.remove_layer(layer))
-        
-        menu.addSeparator()
+        self.iface = iface
+        self.debug_callback = debug_callback
+        
+        # (action, predicate) pairs toggled per layer in popup_for
+        self._conditional_actions = []
+        
+        self.menu = QMenu(parent)
+        self._actions = _LayerMenuActions(None, iface, debug_callback=debug_callback, parent=self.menu)
+        for row in _LAYER_MENU_SPEC:
+            if row is None:
+                self.menu.addSeparator()
+                continue
+            
+            icon_path, label, slot_name, predicate = row
+            action = self.menu.addAction(resource_icon(icon_path), label)
+            action.triggered.connect(getattr(self._actions, slot_name))
+            if predicate is not None:
+                self._conditional_actions.append((action, predicate))
+    
+    def popup_for(self, layer, pos, rename_callback=None):
+        """
+        Show the prebuilt menu for a layer.
         
-        # Copy layer info
-        copy_info_action = menu.addAction(QIcon(":/images/themes/default/mActionEditCopy.svg"), "Copy Layer Info")
-        copy_info_action.triggered.connect(lambda: LayerContextMenu.copy_layer_info(layer))
+        Args:
+            layer: QgsMapLayer the actions apply to
+            pos: Global position to show the menu at
+            rename_callback: Optional callback for rename action
+        """
+        is_vector = layer.type() == QgsMapLayer.VectorLayer
+        for action, predicate in self._conditional_actions:
+            action.setVisible(bool(predicate(layer, is_vector)))
         
-        return menu
+        self._actions.layer = layer
+        self._actions.rename_callback = rename_callback
+        try:
+            self.menu.exec_(pos)
+        finally:
+            # Slots run before exec_ returns; drop references afterwards
+            self._actions.layer = None
+            self._actions.rename_callback = None
     
     @staticmethod
     def create_header_menu(tree_widget):
@@ -117,17 +240,15 @@ class LayerContextMenu:
         menu = QMenu()
         header = tree_widget.header()
         
-        # Column names
-        column_names = ["Layer Name", "Type", "Features/Size", "CRS", "File Type", "File Size", "Source"]
-        
-        for col in range(len(column_names)):
-            action = menu.addAction(column_names[col])
+        for col, column_name in enumerate(COLUMN_NAMES):
+            action = menu.addAction(column_name)
             action.setCheckable(True)
-            action.setChecked(not header.isSectionHidden(col))
+            hidden = header.isSectionHidden(col)
+            action.setChecked(not hidden)
             
             # Use actual checkbox icon instead of checkmark
-            if not header.isSectionHidden(col):
-                action.setIcon(QIcon(":/images/themes/default/mIconSelected.svg"))
+            if not hidden:
+                action.setIcon(_check_icon())
             
             # Don't allow hiding the first column (Layer Name)
             if col == 0:
@@ -148,22 +269,32 @@ class LayerContextMenu:
             iface: QgisInterface instance
         """
         try:
+            project = QgsProject.instance()
+            canvas = iface.mapCanvas()
             extent = layer.extent()
             layer_crs = layer.crs()
-            canvas_crs = iface.mapCanvas().mapSettings().destinationCrs()
+            canvas_crs = canvas.mapSettings().destinationCrs()
+            
+            # Transform extent to canvas CRS if needed; authids are compared as
+            # plain strings, with a full CRS comparison for custom CRSs
+            layer_authid = layer_crs.authid()
+            canvas_authid = canvas_crs.authid()
+            if layer_authid and canvas_authid:
+                needs_transform = layer_authid != canvas_authid
+            else:
+                needs_transform = layer_crs != canvas_crs
             
-            # Transform extent to canvas CRS if needed
-            if layer_crs != canvas_crs:
-                transform = QgsCoordinateTransform(layer_crs, canvas_crs, QgsProject.instance())
+            if needs_transform:
+                transform = _get_transform(layer_crs, canvas_crs, project, layer_authid, canvas_authid)
                 extent = transform.transformBoundingBox(extent)
             
             # Add a small buffer (5%) to the extent
             extent.scale(1.05)
             
-            iface.mapCanvas().setExtent(extent)
-            iface.mapCanvas().refresh()
+            canvas.setExtent(extent)
+            canvas.refresh()
         except Exception as e:
-            print(f"Error zooming to layer: {e}")
+            QgsMessageLog.logMessage(f"Error zooming to layer: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
     @staticmethod
     def copy_layer_info(layer):
@@ -177,7 +308,7 @@ class LayerContextMenu:
             info = LayerService.get_detailed_layer_info(layer)
             QApplication.clipboard().setText(info)
         except Exception as e:
-            print(f"Error copying layer info: {e}")
+            QgsMessageLog.logMessage(f"Error copying layer info: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
     @staticmethod
     def duplicate_layer(layer):
@@ -191,20 +322,15 @@ class LayerContextMenu:
             project = QgsProject.instance()
             
             # Clone the layer
-            if isinstance(layer, QgsVectorLayer):
-                duplicated = layer.clone()
-            elif isinstance(layer, QgsRasterLayer):
-                duplicated = layer.clone()
-            else:
-                duplicated = layer.clone()
+            duplicated = layer.clone()
             
             # Set new name
             duplicated.setName(f"{layer.name()} copy")
             
-            # Add to project
-            project.addMapLayer(duplicated)
+            # Add to project through the batched API
+            project.addMapLayers([duplicated])
         except Exception as e:
-            print(f"Error duplicating layer: {e}")
+            QgsMessageLog.logMessage(f"Error duplicating layer: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
     @staticmethod
     def rename_layer(layer, iface):
@@ -229,10 +355,10 @@ class LayerContextMenu:
             if ok and new_name and new_name != current_name:
                 layer.setName(new_name)
         except Exception as e:
-            print(f"Error renaming layer: {e}")
+            QgsMessageLog.logMessage(f"Error renaming layer: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
-    @staticmethod
-    def set_layer_crs(layer, iface):
+    @classmethod
+    def set_layer_crs(cls, layer, iface):
         """
         Set layer CRS with projection selector dialog.
         
@@ -244,10 +370,12 @@ class LayerContextMenu:
             # Get current CRS
             current_crs = layer.crs()
             
-            # Show CRS selection dialog
-            crs_dialog = QgsProjectionSelectionDialog(iface.mainWindow())
+            # Reuse one CRS selection dialog so the projection tree is only built once
+            if cls._crs_dialog is None:
+                cls._crs_dialog = QgsProjectionSelectionDialog(iface.mainWindow())
+                cls._crs_dialog.setWindowTitle("Select Layer CRS")
+            crs_dialog = cls._crs_dialog
             crs_dialog.setCrs(current_crs)
-            crs_dialog.setWindowTitle("Select Layer CRS")
             
             if crs_dialog.exec():
                 new_crs = crs_dialog.crs()
@@ -256,7 +384,7 @@ class LayerContextMenu:
                     # Refresh the layer
                     layer.triggerRepaint()
         except Exception as e:
-            print(f"Error setting layer CRS: {e}")
+            QgsMessageLog.logMessage(f"Error setting layer CRS: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
     @staticmethod
     def change_data_source(layer, iface, debug_callback=None):
@@ -268,31 +396,28 @@ class LayerContextMenu:
             iface: QgisInterface instance
             debug_callback: Optional callback for debug logging
         """
-        def log(msg):
-            """Helper to log to debug callback or print."""
+        def log(fmt, *args):
+            """Send a debug message to the callback; formatting is skipped without one."""
             if debug_callback:
-                debug_callback(msg)
-            else:
-                print(msg)
+                debug_callback(fmt % args if args else fmt)
         
         try:
-            from qgis.gui import QgsDataSourceSelectDialog
-            from qgis.core import Qgis, QgsVectorLayer, QgsRasterLayer
-            
-            log(f"DEBUG: change_data_source called for layer: {layer.name()}")
-            log(f"DEBUG: Layer provider: {layer.providerType()}")
-            log(f"DEBUG: Layer source: {layer.source()}")
+            project = QgsProject.instance()
+            if debug_callback:
+                # Layer getters are only read when the output is wanted
+                log("DEBUG: change_data_source called for layer: %s", layer.name())
+                log("DEBUG: Layer provider: %s", layer.providerType())
+                log("DEBUG: Layer source: %s", layer.source())
             
             # Determine layer type for filtering
-            if isinstance(layer, QgsVectorLayer):
-                layer_type = Qgis.LayerType.Vector
-                log(f"DEBUG: Layer is Vector")
-            elif isinstance(layer, QgsRasterLayer):
-                layer_type = Qgis.LayerType.Raster
-                log(f"DEBUG: Layer is Raster")
+            layer_type = layer.type()
+            if layer_type == Qgis.LayerType.Vector:
+                log("DEBUG: Layer is Vector")
+            elif layer_type == Qgis.LayerType.Raster:
+                log("DEBUG: Layer is Raster")
             else:
                 layer_type = Qgis.LayerType.Vector  # Default
-                log(f"DEBUG: Layer type unknown, defaulting to Vector")
+                log("DEBUG: Layer type unknown, defaulting to Vector")
             
             # Create the data source selection dialog
             # This is the same dialog QGIS uses internally
@@ -306,57 +431,57 @@ class LayerContextMenu:
             dialog.setWindowTitle(f"Change Data Source - {layer.name()}")
             dialog.setDescription(f"Current source: {layer.source()}")
             
-            log(f"DEBUG: Created QgsDataSourceSelectDialog")
+            log("DEBUG: Created QgsDataSourceSelectDialog")
             
             # Try to expand to the current file's directory
             current_source = layer.source()
             if '|' in current_source:
                 current_source = current_source.split('|')[0]
             
-            import os
             if os.path.isfile(current_source):
                 dir_path = os.path.dirname(current_source)
-                log(f"DEBUG: Expanding to directory: {dir_path}")
+                log("DEBUG: Expanding to directory: %s", dir_path)
                 dialog.expandPath(dir_path)
             
             # Show the dialog
             if dialog.exec():
                 uri = dialog.uri()
-                log(f"DEBUG: Dialog accepted")
-                log(f"DEBUG: Selected URI: {uri.uri if uri else 'None'}")
-                log(f"DEBUG: Selected name: {uri.name if uri else 'None'}")
-                log(f"DEBUG: Selected provider: {uri.providerKey if uri else 'None'}")
+                if debug_callback:
+                    log("DEBUG: Dialog accepted")
+                    log("DEBUG: Selected URI: %s", uri.uri if uri else 'None')
+                    log("DEBUG: Selected name: %s", uri.name if uri else 'None')
+                    log("DEBUG: Selected provider: %s", uri.providerKey if uri else 'None')
                 
                 if uri and uri.uri:
                     new_source = uri.uri
                     
                     if new_source != layer.source():
                         # Update the layer's data source
-                        log(f"DEBUG: Updating data source to: {new_source}")
+                        log("DEBUG: Updating data source to: %s", new_source)
                         layer.setDataSource(new_source, layer.name(), layer.providerType())
                         layer.reload()
                         layer.triggerRepaint()
                         
                         # Emit dataChanged signal to refresh UI
-                        from qgis.core import QgsProject
-                        QgsProject.instance().layerTreeRoot().layerOrderChanged.emit()
+                        project.layerTreeRoot().layerOrderChanged.emit()
                         
                         # Refresh the canvas
                         iface.mapCanvas().refresh()
                         
-                        log(f"DEBUG: Data source updated successfully")
-                        log(f"DEBUG: New layer source: {layer.source()}")
+                        if debug_callback:
+                            log("DEBUG: Data source updated successfully")
+                            log("DEBUG: New layer source: %s", layer.source())
                     else:
-                        log(f"DEBUG: Source unchanged")
+                        log("DEBUG: Source unchanged")
                 else:
-                    log(f"DEBUG: No valid URI selected")
+                    log("DEBUG: No valid URI selected")
             else:
-                log(f"DEBUG: Dialog cancelled")
+                log("DEBUG: Dialog cancelled")
                 
         except Exception as e:
-            log(f"ERROR in change_data_source: {e}")
-            import traceback
-            log(traceback.format_exc())
+            QgsMessageLog.logMessage(f"Error changing data source: {e}", "CeeThreeDeeQTools", Qgis.Warning)
+            if debug_callback:
+                debug_callback(traceback.format_exc())
     
     @staticmethod
     def _change_data_source_fallback(layer, iface, debug_callback=None):
@@ -368,21 +493,17 @@ class LayerContextMenu:
             iface: QgisInterface instance
             debug_callback: Optional callback for debug logging
         """
-        def log(msg):
-            """Helper to log to debug callback or print."""
+        def log(fmt, *args):
+            """Send a debug message to the callback; formatting is skipped without one."""
             if debug_callback:
-                debug_callback(msg)
-            else:
-                print(msg)
+                debug_callback(fmt % args if args else fmt)
         
-        from qgis.PyQt.QtWidgets import QFileDialog
-        import os
-        
-        log(f"DEBUG: _change_data_source_fallback called for layer: {layer.name()}")
+        if debug_callback:
+            log("DEBUG: _change_data_source_fallback called for layer: %s", layer.name())
         
         # Get the directory of the current layer's source
         current_source = layer.source()
-        log(f"DEBUG: Current source: {current_source}")
+        log("DEBUG: Current source: %s", current_source)
         
         start_dir = ""
         
@@ -395,20 +516,21 @@ class LayerContextMenu:
             
             if os.path.isfile(current_source):
                 start_dir = os.path.dirname(current_source)
-                log(f"DEBUG: Starting in directory: {start_dir}")
+                log("DEBUG: Starting in directory: %s", start_dir)
             elif os.path.isdir(current_source):
                 start_dir = current_source
-                log(f"DEBUG: Starting in directory (is dir): {start_dir}")
+                log("DEBUG: Starting in directory (is dir): %s", start_dir)
         
         # Determine file filter based on layer type
-        if isinstance(layer, QgsVectorLayer):
-            file_filter = "All Vector Files (*.shp *.gpkg *.geojson *.kml *.gml);;Shapefiles (*.shp);;GeoPackage (*.gpkg);;GeoJSON (*.geojson);;All Files (*.*)"
-        elif isinstance(layer, QgsRasterLayer):
-            file_filter = "All Raster Files (*.tif *.tiff *.img *.asc *.grd);;GeoTIFF (*.tif *.tiff);;All Files (*.*)"
+        layer_type = layer.type()
+        if layer_type == QgsMapLayer.VectorLayer:
+            file_filter = _VECTOR_FILTER
+        elif layer_type == QgsMapLayer.RasterLayer:
+            file_filter = _RASTER_FILTER
         else:
-            file_filter = "All Files (*.*)"
+            file_filter = _ALL_FILTER
         
-        log(f"DEBUG: Using filter: {file_filter}")
+        log("DEBUG: Using filter: %s", file_filter)
         
         # Open file dialog starting in the current file's directory
         new_source, _ = QFileDialog.getOpenFileName(
@@ -419,20 +541,20 @@ class LayerContextMenu:
         )
         
         if new_source:
-            log(f"DEBUG: User selected: {new_source}")
+            log("DEBUG: User selected: %s", new_source)
             try:
                 # Update the layer's data source
                 provider_name = layer.providerType()
                 layer.setDataSource(new_source, layer.name(), provider_name)
                 layer.reload()
                 layer.triggerRepaint()
-                log(f"DEBUG: Data source updated successfully")
+                log("DEBUG: Data source updated successfully")
             except Exception as e:
-                log(f"ERROR updating data source: {e}")
-                import traceback
-                log(traceback.format_exc())
+                QgsMessageLog.logMessage(f"Error updating data source: {e}", "CeeThreeDeeQTools", Qgis.Warning)
+                if debug_callback:
+                    debug_callback(traceback.format_exc())
         else:
-            log(f"DEBUG: User cancelled file selection")
+            log("DEBUG: User cancelled file selection")
     
     @staticmethod
     def remove_layer(layer):
@@ -446,10 +568,10 @@ class LayerContextMenu:
             project = QgsProject.instance()
             project.removeMapLayer(layer.id())
         except Exception as e:
-            print(f"Error removing layer: {e}")
+            QgsMessageLog.logMessage(f"Error removing layer: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
-    @staticmethod
-    def open_layer_styling_panel(layer, iface):
+    @classmethod
+    def open_layer_styling_panel(cls, layer, iface):
         """
         Open the QGIS Layer Styling Panel for a layer.
         
@@ -467,19 +589,17 @@ class LayerContextMenu:
                     styling_dock.setVisible(True)
             else:
                 # If it doesn't exist, create it using the action
-                # Find and trigger the Layer Styling Panel action
-                actions = iface.mainWindow().findChildren(QObject)
-                for action in actions:
-                    if hasattr(action, 'objectName') and action.objectName() == "mActionStyleDock":
-                        if hasattr(action, 'trigger'):
-                            action.trigger()
-                        break
+                # Look up the Layer Styling Panel action once and reuse it
+                if cls._style_dock_action is None:
+                    cls._style_dock_action = iface.mainWindow().findChild(QAction, "mActionStyleDock")
+                if cls._style_dock_action:
+                    cls._style_dock_action.trigger()
             
             # Set the current layer in the styling panel
             iface.setActiveLayer(layer)
             
         except Exception as e:
-            print(f"Error opening layer styling panel: {e}")
+            QgsMessageLog.logMessage(f"Error opening layer styling panel: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
     @staticmethod
     def create_multi_layer_menu(layers, iface):
@@ -493,41 +613,38 @@ class LayerContextMenu:
         Returns:
             QMenu: The created menu
         """
-        from ..services.layer_operations_service import LayerOperationsService
-        
         menu = QMenu()
         
         # Add to Group submenu
-        add_to_group_menu = menu.addMenu(QIcon(":/images/themes/default/mActionAddGroup.svg"), "Add to Group")
+        add_to_group_menu = menu.addMenu(resource_icon(":/images/themes/default/mActionAddGroup.svg"), "Add to Group")
         
         # Get all existing groups
         groups = LayerOperationsService.get_all_groups()
         
         if groups:
-            for group_name in sorted(groups):
+            # One helper holds the layer ids; each action binds only its group name
+            menu._group_actions = _GroupMenuHelper([layer.id() for layer in layers], parent=menu)
+            move_to = menu._group_actions.move_to
+            for group_name in sorted(groups, key=str.lower):
                 group_action = add_to_group_menu.addAction(group_name)
-                layer_ids = [layer.id() for layer in layers]
-                group_action.triggered.connect(
-                    lambda checked, gname=group_name, lids=layer_ids: 
-                    LayerOperationsService.move_layers_to_group(lids, gname)
-                )
+                group_action.triggered.connect(partial(move_to, group_name))
         
         # Add separator and "New Group" option
         add_to_group_menu.addSeparator()
-        new_group_action = add_to_group_menu.addAction(QIcon(":/images/themes/default/mActionNewFolder.svg"), "New Group...")
+        new_group_action = add_to_group_menu.addAction(resource_icon(":/images/themes/default/mActionNewFolder.svg"), "New Group...")
         new_group_action.triggered.connect(
-            lambda: LayerContextMenu._create_new_group_and_move_layers(layers, iface)
+            lambda checked, lyrs=layers, i=iface: LayerContextMenu._create_new_group_and_move_layers(lyrs, i)
         )
         
         menu.addSeparator()
         
         # Remove layers
         remove_action = menu.addAction(
-            QIcon(":/images/themes/default/mActionRemoveLayer.svg"), 
+            resource_icon(":/images/themes/default/mActionRemoveLayer.svg"), 
             f"Remove {len(layers)} Layers"
         )
         remove_action.triggered.connect(
-            lambda: LayerContextMenu._remove_multiple_layers(layers)
+            lambda checked, lyrs=layers, canvas=iface.mapCanvas(): LayerContextMenu._remove_multiple_layers(lyrs, canvas)
         )
         
         return menu
@@ -541,8 +658,6 @@ class LayerContextMenu:
             layers: List of QgsMapLayer objects to move
             iface: QgisInterface instance
         """
-        from ..services.layer_operations_service import LayerOperationsService
-        
         try:
             # Prompt for group name
             group_name, ok = QInputDialog.getText(
@@ -562,21 +677,55 @@ class LayerContextMenu:
                 LayerOperationsService.move_layers_to_group(layer_ids, group_name)
         
         except Exception as e:
-            print(f"Error creating new group: {e}")
+            QgsMessageLog.logMessage(f"Error creating new group: {e}", "CeeThreeDeeQTools", Qgis.Warning)
     
     @staticmethod
-    def _remove_multiple_layers(layers):
+    def _remove_multiple_layers(layers, canvas=None):
         """
-        Remove multiple layers from the project.
+        Remove multiple layers from the project in a single batch.
         
         Args:
             layers: List of QgsMapLayer objects to remove
+            canvas: Optional QgsMapCanvas frozen while the layers are removed
         """
+        if canvas:
+            canvas.freeze(True)
         try:
             project = QgsProject.instance()
-            for layer in layers:
-                project.removeMapLayer(layer.id())
+            project.removeMapLayers([layer.id() for layer in layers])
         except Exception as e:
-            print(f"Error removing layers: {e}")
+            QgsMessageLog.logMessage(f"Error removing layers: {e}", "CeeThreeDeeQTools", Qgis.Warning)
+        finally:
+            if canvas:
+                canvas.freeze(False)
+                canvas.refresh()
 
 
+# Layer menu rows: (icon path, label, _LayerMenuActions slot name, predicate),
+# None for a separator. Predicates are called as predicate(layer, is_vector)
+# and hide the row when False.
+_LAYER_MENU_SPEC = (
+    (":/images/themes/default/mActionZoomToLayer.svg", "Zoom to Layer", "_on_zoom", None),
+    (":/images/themes/default/mActionZoomToSelected.svg", "Zoom to Selected", "_on_zoom_selected",
+     lambda layer, is_vector: is_vector and layer.selectedFeatureCount() > 0),
+    None,
+    (":/images/themes/default/mActionOpenTable.svg", "Open Attribute Table", "_on_open_attr",
+     lambda layer, is_vector: is_vector),
+    (":/images/themes/default/mActionOptions.svg", "Properties...", "_on_props", None),
+    (":/images/themes/default/mActionStyleManager.svg", "Edit Layer Style", "_on_style", None),
+    None,
+    (":/images/themes/default/mActionToggleEditing.svg", "Toggle Editing (On)", "_on_toggle_edit",
+     lambda layer, is_vector: is_vector and layer.isEditable()),
+    (":/images/themes/default/mActionToggleEditing.svg", "Toggle Editing", "_on_toggle_edit",
+     lambda layer, is_vector: is_vector and not layer.isEditable()),
+    None,
+    (":/images/themes/default/mActionDuplicateLayer.svg", "Duplicate Layer", "_on_duplicate", None),
+    (":/images/themes/default/mActionEditableEdits.svg", "Rename Layer\tF2", "_on_rename", None),
+    None,
+    (":/images/themes/default/mActionChangeLabelProperties.svg", "Change Data Source...", "_on_change_source", None),
+    (":/images/themes/default/mActionSetProjection.svg", "Set Layer CRS...", "_on_set_crs", None),
+    None,
+    (":/images/themes/default/mActionRemoveLayer.svg", "Remove Layer", "_on_remove", None),
+    None,
+    (":/images/themes/default/mActionEditCopy.svg", "Copy Layer Info", "_on_copy_info", None),
+)
@@ -3,9 +3,15 @@ Event handlers for LayersAdvanced dialog interactions.
 """
 
 from qgis.core import QgsProject, QgsVectorLayer
-from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtCore import Qt, QEvent
 from qgis.PyQt.QtWidgets import QTreeWidgetItem, QLineEdit
 
+from ..roles import ROLE_ID, ROLE_TYPE, ROLE_NAME_LOWER, ROLE_ORIGINAL_NAME
+from .filter_widget import FilterService
+
+# Item types that can be renamed and toggled as a whole
+_LAYER_GROUP = frozenset(("layer", "group"))
+
 
 class EventHandlers:
     """Handlers for UI events in the LayersAdvanced dialog."""
@@ -19,8 +25,6 @@ class EventHandlers:
     @staticmethod
     def handle_f2_key_press(dialog, event):
         """Handle F2 key press to start renaming."""
-        from qgis.PyQt.QtCore import Qt, QEvent
-        
         if event.type() == QEvent.Type.KeyPress and event.key() == Qt.Key.Key_F2:
             selected = dialog.layer_tree.selectedItems()
             if len(selected) == 1:
@@ -37,25 +41,22 @@ class EventHandlers:
             dialog: The LayersAdvancedDialog instance
             item: The tree item to rename
         """
-        item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
+        item_type = item.data(0, ROLE_TYPE)
         
         # Only allow renaming layers and groups, not symbology items
-        if item_type in ("layer", "group"):
-            # Store original name and enable editing
-            item.setData(0, Qt.ItemDataRole.UserRole + 2, item.text(0))  # Store original name
-            
-            # Disconnect the itemChanged signal temporarily
+        if item_type in _LAYER_GROUP:
+            # Store original name and make the item editable; neither change
+            # should reach the itemChanged handlers
+            dialog.layer_tree.blockSignals(True)
             try:
-                dialog.layer_tree.itemChanged.disconnect(dialog.on_item_visibility_changed)
-            except (TypeError, RuntimeError):
-                pass
+                item.setData(0, ROLE_ORIGINAL_NAME, item.text(0))
+                item.setFlags(item.flags() | Qt.ItemIsEditable)
+            finally:
+                dialog.layer_tree.blockSignals(False)
             
-            # Make item editable and start editing
-            item.setFlags(item.flags() | Qt.ItemIsEditable)
+            # Route the edit commit to the rename handler, then start editing
+            dialog._rename_pending = True
             dialog.layer_tree.editItem(item, 0)
-            
-            # Reconnect when done
-            dialog.layer_tree.itemChanged.connect(dialog.on_item_name_changed)
     
     @staticmethod
     def finish_rename(dialog, item, column):
@@ -70,27 +71,27 @@ class EventHandlers:
         if column != 0:
             return
         
-        # Disconnect rename signal
+        # Make item non-editable again and refresh the cached filter name
+        # without re-emitting itemChanged
+        dialog._rename_pending = False
+        dialog.layer_tree.blockSignals(True)
         try:
-            dialog.layer_tree.itemChanged.disconnect(dialog.on_item_name_changed)
-        except (TypeError, RuntimeError):
-            pass
-        
-        # Make item non-editable again
-        item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-        
-        # Reconnect normal signal
-        dialog.layer_tree.itemChanged.connect(dialog.on_item_visibility_changed)
+            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+            item.setData(0, ROLE_NAME_LOWER, item.text(0).lower())
+        finally:
+            dialog.layer_tree.blockSignals(False)
+        FilterService.reset_search_cache()
         
         # Get the new name and item info
         new_name = item.text(0)
-        original_name = item.data(0, Qt.ItemDataRole.UserRole + 2)
-        item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-        item_id = item.data(0, Qt.ItemDataRole.UserRole)
+        original_name = item.data(0, ROLE_ORIGINAL_NAME)
+        item_type = item.data(0, ROLE_TYPE)
+        item_id = item.data(0, ROLE_ID)
         
         # If name didn't change, nothing to do
         if new_name == original_name or not new_name.strip():
             item.setText(0, original_name)
+            item.setData(0, ROLE_NAME_LOWER, original_name.lower())
             return
         
         # Apply the rename to QGIS
@@ -106,48 +107,30 @@ class EventHandlers:
             if group_node:
                 group_node.setName(new_name)
                 # Update the item_id since group names are used as IDs
-                item.setData(0, Qt.ItemDataRole.UserRole, new_name)
+                item.setData(0, ROLE_ID, new_name)
     
     @staticmethod
     def handle_show_all(dialog):
         """Handle Show All button click."""
-        from ..services.visibility_service import VisibilityService
-        
         selected_items = dialog.layer_tree.selectedItems()
         
         if selected_items:
-            # Show only selected items
-            for item in selected_items:
-                item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-                if item_type in ("layer", "group"):
-                    dialog.toggle_selected_visibility(True)
+            # Show only selected items; one pass covers the whole selection
+            if any(item.data(0, ROLE_TYPE) in _LAYER_GROUP for item in selected_items):
+                dialog.toggle_selected_visibility(True)
         else:
-            # Show all layers
-            root_item = dialog.layer_tree.invisibleRootItem()
-            for i in range(root_item.childCount()):
-                child = root_item.child(i)
-                item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-                if item_type == "layer" or item_type == "group":
-                    child.setCheckState(0, Qt.CheckState.Checked)
+            # Show all layers in one bulk update
+            dialog.set_all_layers_visibility(True)
     
     @staticmethod
     def handle_hide_all(dialog):
         """Handle Hide All button click."""
-        from ..services.visibility_service import VisibilityService
-        
         selected_items = dialog.layer_tree.selectedItems()
         
         if selected_items:
-            # Hide only selected items
-            for item in selected_items:
-                item_type = item.data(0, Qt.ItemDataRole.UserRole + 1)
-                if item_type in ("layer", "group"):
-                    dialog.toggle_selected_visibility(False)
+            # Hide only selected items; one pass covers the whole selection
+            if any(item.data(0, ROLE_TYPE) in _LAYER_GROUP for item in selected_items):
+                dialog.toggle_selected_visibility(False)
         else:
-            # Hide all layers
-            root_item = dialog.layer_tree.invisibleRootItem()
-            for i in range(root_item.childCount()):
-                child = root_item.child(i)
-                item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-                if item_type == "layer" or item_type == "group":
-                    child.setCheckState(0, Qt.CheckState.Unchecked)
+            # Hide all layers in one bulk update
+            dialog.set_all_layers_visibility(False)
@@ -2,12 +2,47 @@
 Service for filtering/searching tree items.
 """
 
-from qgis.PyQt.QtCore import Qt
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from ..roles import ROLE_TYPE, ROLE_NAME_LOWER
+from .layer_tree_builder import LayerTreeBuilder
+
+
+@dataclass
+class TreeIndex:
+    """
+    Tree items flattened breadth-first into parallel arrays.
+    
+    Row 0 is the invisible root. Each depth level occupies a contiguous
+    row range, levels[d]:levels[d + 1], so parent/child propagation runs
+    one vectorized step per level instead of one Python step per item.
+    """
+    
+    items: List[object]
+    names: np.ndarray  # lowercase item names (str)
+    parents: np.ndarray  # parent row of each row (int)
+    is_layer: np.ndarray  # bool
+    hidden: np.ndarray  # bool, hidden state currently applied to the items
+    levels: List[int]
 
 
 class FilterService:
     """Static service for filtering tree widget items."""
     
+    # Lowercase text of the last filter pass, used to narrow the next one
+    _last_search = ""
+    # TreeIndex of the current tree, built on the first filter after a rebuild
+    _index = None
+    
+    @staticmethod
+    def reset_search_cache():
+        """Forget the last search and the tree index, e.g. after the tree changes."""
+        FilterService._last_search = ""
+        FilterService._index = None
+    
     @staticmethod
     def filter_tree(tree_widget, search_text):
         """
@@ -16,122 +51,158 @@ class FilterService:
         Args:
             tree_widget: The QTreeWidget to filter
             search_text: Text to search for (case-insensitive)
-            
+        
         Returns:
             Tuple of (total_layers, hidden_layers) counts
         """
         search_lower = search_text.lower()
+        last_search = FilterService._last_search
+        
+        # Same search over an unchanged tree: every item is already in its
+        # wanted state (e.g. text edited and restored within the debounce)
+        if FilterService._index is not None and search_lower == last_search:
+            return (LayerTreeBuilder.total_layers, LayerTreeBuilder.hidden_layers)
+        
+        # Repaint once after the pass instead of per setHidden call
+        updates_were_enabled = tree_widget.updatesEnabled()
+        tree_widget.setUpdatesEnabled(False)
+        signals_were_blocked = tree_widget.blockSignals(True)
+        try:
+            index = FilterService._index
+            if index is None:
+                index = FilterService._index = FilterService._build_index(tree_widget)
+            
+            # Narrowed search: anything hidden by the last pass stays hidden,
+            # so only the visible rows need matching
+            narrowing = bool(search_lower and last_search and search_lower.startswith(last_search))
+            hidden = FilterService._hidden_mask(index, search_lower, narrowing)
+            
+            try:
+                FilterService._apply_hidden(index, hidden)
+            except RuntimeError:
+                # An item was deleted behind the index; rebuild it and
+                # filter from scratch
+                index = FilterService._index = FilterService._build_index(tree_widget)
+                hidden = FilterService._hidden_mask(index, search_lower, False)
+                FilterService._apply_hidden(index, hidden)
+            
+            LayerTreeBuilder.hidden_layers = int(np.count_nonzero(hidden & index.is_layer))
+        finally:
+            tree_widget.blockSignals(signals_were_blocked)
+            tree_widget.setUpdatesEnabled(updates_were_enabled)
         
-        # If no search text, show everything
-        if not search_text:
-            FilterService._show_all_items(tree_widget.invisibleRootItem())
-            total_count = FilterService._count_layers(tree_widget.invisibleRootItem())
-            return (total_count, 0)
-        
-        # Hide items that don't match, show those that do
-        FilterService._filter_item_recursive(tree_widget.invisibleRootItem(), search_lower)
-        
-        # Count total and hidden layers
-        total_count = FilterService._count_layers(tree_widget.invisibleRootItem())
-        hidden_count = FilterService._count_hidden_layers(tree_widget.invisibleRootItem())
+        FilterService._last_search = search_lower
         
-        return (total_count, hidden_count)
+        # The total is maintained by LayerTreeBuilder as items are built
+        return (LayerTreeBuilder.total_layers, LayerTreeBuilder.hidden_layers)
     
     @staticmethod
-    def _filter_item_recursive(parent_item, search_text):
+    def _build_index(tree_widget):
         """
-        Recursively filter items in the tree.
+        Flatten the tree breadth-first into a TreeIndex.
         
         Args:
-            parent_item: Parent tree widget item
-            search_text: Lowercase search text
-            
+            tree_widget: The QTreeWidget to index
+        
         Returns:
-            True if this item or any child matches, False otherwise
+            TreeIndex of the tree's current items and hidden states
         """
-        has_visible_child = False
-        
-        # Process all children first
-        for i in range(parent_item.childCount()):
-            child = parent_item.child(i)
-            child_matches = FilterService._filter_item_recursive(child, search_text)
-            if child_matches:
-                has_visible_child = True
-        
-        # Check if this item matches
-        if parent_item != parent_item.treeWidget().invisibleRootItem():
-            item_text = parent_item.text(0).lower()
-            item_matches = search_text in item_text
-            
-            # Show item if it matches or has visible children
-            should_show = item_matches or has_visible_child
-            parent_item.setHidden(not should_show)
+        root_item = tree_widget.invisibleRootItem()
+        items = [root_item]
+        names = [""]
+        parents = [0]
+        is_layer = [False]
+        hidden = [False]
+        levels = [0, 1]
+        
+        while True:
+            for row in range(levels[-2], levels[-1]):
+                item = items[row]
+                child_at = item.child
+                for i in range(item.childCount()):
+                    child = child_at(i)
+                    
+                    # Layers and groups carry their lowercased name, symbology
+                    # items fall back to the text
+                    name_lower = child.data(0, ROLE_NAME_LOWER)
+                    if name_lower is None:
+                        name_lower = child.text(0).lower()
+                    
+                    items.append(child)
+                    names.append(name_lower)
+                    parents.append(row)
+                    is_layer.append(child.data(0, ROLE_TYPE) == "layer")
+                    hidden.append(child.isHidden())
             
-            return should_show
-        
-        return has_visible_child
+            if len(items) == levels[-1]:
+                break
+            levels.append(len(items))
+        
+        return TreeIndex(
+            items=items,
+            names=np.array(names, dtype=str),
+            parents=np.array(parents, dtype=np.intp),
+            is_layer=np.array(is_layer, dtype=bool),
+            hidden=np.array(hidden, dtype=bool),
+            levels=levels,
+        )
     
     @staticmethod
-    def _show_all_items(parent_item):
+    def _hidden_mask(index, search_text, narrowing):
         """
-        Recursively show all items in the tree.
+        Work out which rows should be hidden for a search.
         
-        Args:
-            parent_item: Parent tree widget item
-        """
-        for i in range(parent_item.childCount()):
-            child = parent_item.child(i)
-            child.setHidden(False)
-            FilterService._show_all_items(child)
-    
-    @staticmethod
-    def _count_layers(parent_item):
-        """
-        Recursively count all layer items (not groups) in the tree.
+        An item whose name matches shows its whole subtree. Other items are
+        shown only when a descendant matches.
         
         Args:
-            parent_item: Parent tree widget item
-            
+            index: TreeIndex of the tree
+            search_text: Lowercase search text
+            narrowing: Only match rows that are currently visible
+        
         Returns:
-            Count of layer items
+            Bool array, True for rows to hide (never the root row)
         """
-        count = 0
-        
-        for i in range(parent_item.childCount()):
-            child = parent_item.child(i)
-            item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-            
-            # Only count actual layers, not groups or symbology items
-            if item_type == "layer":
-                count += 1
-            
-            # Recurse into children (groups)
-            count += FilterService._count_layers(child)
-        
-        return count
+        row_count = len(index.items)
+        if not search_text:
+            return np.zeros(row_count, dtype=bool)
+        
+        # Substring match over the rows that can still be shown
+        shown = np.zeros(row_count, dtype=bool)
+        if narrowing:
+            rows = np.flatnonzero(~index.hidden)
+            rows = rows[rows > 0]
+        else:
+            rows = np.arange(1, row_count)
+        if len(rows):
+            shown[rows] = np.char.find(index.names[rows], search_text) >= 0
+        
+        parents = index.parents
+        levels = index.levels
+        
+        # Top-down: rows under a matching ancestor are shown
+        for depth in range(2, len(levels) - 1):
+            start, end = levels[depth], levels[depth + 1]
+            shown[start:end] |= shown[parents[start:end]]
+        
+        # Bottom-up: a shown row keeps its parent shown
+        for depth in range(len(levels) - 2, 1, -1):
+            start, end = levels[depth], levels[depth + 1]
+            shown[parents[start + np.flatnonzero(shown[start:end])]] = True
+        
+        shown[0] = True
+        return ~shown
     
     @staticmethod
-    def _count_hidden_layers(parent_item):
+    def _apply_hidden(index, hidden):
         """
-        Recursively count hidden layer items (not groups) in the tree.
+        Call setHidden only on the items whose state changes.
         
         Args:
-            parent_item: Parent tree widget item
-            
-        Returns:
-            Count of hidden layer items
+            index: TreeIndex of the tree (its hidden array is updated)
+            hidden: Bool array of the wanted hidden state per row
         """
-        count = 0
-        
-        for i in range(parent_item.childCount()):
-            child = parent_item.child(i)
-            item_type = child.data(0, Qt.ItemDataRole.UserRole + 1)
-            
-            # Only count hidden actual layers, not groups or symbology items
-            if item_type == "layer" and child.isHidden():
-                count += 1
-            
-            # Recurse into children (groups)
-            count += FilterService._count_hidden_layers(child)
-        
-        return count
+        items = index.items
+        for row in np.flatnonzero(hidden != index.hidden).tolist():
+            items[row].setHidden(bool(hidden[row]))
+        index.hidden = hidden
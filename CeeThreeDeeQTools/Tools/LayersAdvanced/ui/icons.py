@@ -0,0 +1,25 @@
+"""
+Shared icons for the Layers Advanced UI.
+"""
+
+from qgis.PyQt.QtGui import QIcon
+
+
+# Resource icons, keyed by resource path
+_ICON_CACHE = {}
+
+
+def resource_icon(path):
+    """
+    Return the shared QIcon for a Qt resource path, creating it on first use.
+    
+    Args:
+        path: Resource path, e.g. ":/images/themes/default/mActionFolder.svg"
+        
+    Returns:
+        QIcon
+    """
+    icon = _ICON_CACHE.get(path)
+    if icon is None:
+        icon = _ICON_CACHE[path] = QIcon(path)
+    return icon
@@ -9,16 +9,20 @@
 ***************************************************************************
 """
 
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from qgis.PyQt.QtWidgets import QTreeWidgetItem, QWidget, QHBoxLayout, QLabel
-from qgis.PyQt.QtCore import Qt, QSize
-from qgis.PyQt.QtGui import QIcon, QPixmap, QPainter, QColor, QLinearGradient
+from qgis.PyQt.QtCore import Qt, QSize, QRectF
+from qgis.PyQt.QtGui import QIcon, QPixmap, QPainter, QColor, QImage, QFont
 from qgis.core import (
     QgsMapLayer,
     QgsLayerTreeGroup,
     QgsLayerTreeLayer,
-    QgsVectorLayer,
-    QgsRasterLayer,
     QgsSymbol,
+    QgsSymbolLayerUtils,
     QgsRendererCategory,
     QgsCategorizedSymbolRenderer,
     QgsSingleSymbolRenderer,
@@ -28,10 +32,215 @@ from qgis.core import (
     QgsSingleBandPseudoColorRenderer,
     QgsSingleBandGrayRenderer,
     QgsMultiBandColorRenderer,
-    QgsRasterContourRenderer
+    QgsRasterContourRenderer,
+    QgsColorRampShader
 )
 from ..services.layer_service import LayerService
 from ..services.visibility_service import VisibilityService
+from ..roles import ROLE_ID, ROLE_TYPE, ROLE_KEY, ROLE_NAME_LOWER
+from .icons import resource_icon
+
+# Colour ramp types listed as discrete classes rather than drawn as a gradient
+_DISCRETE_EXACT = (QgsColorRampShader.Discrete, QgsColorRampShader.Exact)
+
+# Pixmap size for symbol preview icons
+_ICON_SIZE = QSize(16, 16)
+
+# Item fonts shared by every group and symbology item, built on first use
+# since QFont needs the application to exist
+_GROUP_FONT = None
+_CHILD_FONT = None
+
+
+def _group_font():
+    """Return the bold font used for group items."""
+    global _GROUP_FONT
+    if _GROUP_FONT is None:
+        _GROUP_FONT = QFont()
+        _GROUP_FONT.setBold(True)
+    return _GROUP_FONT
+
+
+def _child_font():
+    """Return the one-point-smaller font used for symbology items."""
+    global _CHILD_FONT
+    if _CHILD_FONT is None:
+        _CHILD_FONT = QFont()
+        _CHILD_FONT.setPointSize(_CHILD_FONT.pointSize() - 1)
+    return _CHILD_FONT
+
+
+# Symbol preview icons keyed by the symbol's XML properties; identical
+# symbols (common across categories and layers) are painted once
+_SYMBOL_ICON_CACHE = {}
+_SYMBOL_ICON_CACHE_SIZE = 512
+
+# Transparent 16x16 pixmap copied for each new symbol icon, built on first use
+_BLANK_ICON_PIXMAP = None
+
+
+def _blank_icon_pixmap():
+    """Return the transparent template pixmap for symbol icons."""
+    global _BLANK_ICON_PIXMAP
+    if _BLANK_ICON_PIXMAP is None:
+        _BLANK_ICON_PIXMAP = QPixmap(_ICON_SIZE)
+        _BLANK_ICON_PIXMAP.fill(Qt.transparent)
+    return _BLANK_ICON_PIXMAP
+
+
+def _trace(dialog):
+    """
+    Return the dialog to write per-item trace messages to.
+    
+    Args:
+        dialog: LayersAdvancedDialog instance, or None
+        
+    Returns:
+        The dialog when its debug_enabled is set, otherwise None
+    """
+    if dialog is not None and dialog.debug_enabled:
+        return dialog
+    return None
+
+
+# Solid colour swatch icons for raster classes, keyed by colour rgba
+_SWATCH_ICON_CACHE = {}
+
+
+def _swatch_icon(color):
+    """
+    Return a cached icon filled with a single colour.
+    
+    Args:
+        color: QColor of the swatch
+        
+    Returns:
+        QIcon
+    """
+    key = color.rgba()
+    icon = _SWATCH_ICON_CACHE.get(key)
+    if icon is None:
+        pixmap = QPixmap(_ICON_SIZE)
+        pixmap.fill(color)
+        icon = _SWATCH_ICON_CACHE[key] = QIcon(pixmap)
+    return icon
+
+
+# Red/green/blue indicator icon for multiband colour rasters, built on first use
+_RGB_ICON = None
+
+
+def _rgb_icon():
+    """Return the shared RGB indicator icon."""
+    global _RGB_ICON
+    if _RGB_ICON is None:
+        pixmap = QPixmap(48, 16)
+        painter = QPainter(pixmap)
+        painter.fillRect(0, 0, 16, 16, QColor(255, 0, 0))
+        painter.fillRect(16, 0, 16, 16, QColor(0, 255, 0))
+        painter.fillRect(32, 0, 16, 16, QColor(0, 0, 255))
+        painter.end()
+        _RGB_ICON = QIcon(pixmap)
+    return _RGB_ICON
+
+
+# Empty texts for the columns after the name (type, info, CRS, file type,
+# size, source)
+_EMPTY_COLUMNS = [""] * 6
+
+
+# Contour line icons keyed by (colour rgba, pen width)
+_LINE_ICON_CACHE = {}
+
+
+def _line_icon(color, width):
+    """
+    Return a cached icon showing a horizontal line.
+    
+    Args:
+        color: QColor of the line
+        width: Pen width in pixels
+        
+    Returns:
+        QIcon
+    """
+    key = (color.rgba(), width)
+    icon = _LINE_ICON_CACHE.get(key)
+    if icon is None:
+        pixmap = _blank_icon_pixmap().copy()
+        painter = QPainter(pixmap)
+        pen = painter.pen()
+        pen.setColor(color)
+        pen.setWidth(width)
+        painter.setPen(pen)
+        painter.drawLine(0, 8, 16, 8)
+        painter.end()
+        icon = _LINE_ICON_CACHE[key] = QIcon(pixmap)
+    return icon
+
+
+def _stat_source(source):
+    """
+    Stat a layer source.
+    
+    Args:
+        source: Layer source string
+        
+    Returns:
+        int: File size in bytes, or None when the source is not a file path
+    """
+    try:
+        return os.stat(source).st_size
+    except (OSError, ValueError):
+        # Not a file path (e.g., URLs, database connections)
+        return None
+
+
+# {source: size in bytes or None} for the current tree build
+_SOURCE_SIZES = {}
+
+
+def _source_size(source):
+    """Return the size of a layer source, statting it once per tree build."""
+    try:
+        return _SOURCE_SIZES[source]
+    except KeyError:
+        size = _SOURCE_SIZES[source] = _stat_source(source)
+        return size
+
+
+# Worker threads used to stat layer sources ahead of a tree build; the
+# executor is created on first use and reused by later builds
+_STAT_WORKERS = 8
+_STAT_POOL = None
+
+
+def _stat_pool():
+    """Return the shared executor for statting layer sources."""
+    global _STAT_POOL
+    if _STAT_POOL is None:
+        _STAT_POOL = ThreadPoolExecutor(max_workers=_STAT_WORKERS)
+    return _STAT_POOL
+
+
+# (unit, decimal places) for each power of 1024, used by _format_size
+_SIZE_UNITS = (("B", 0), ("KB", 1), ("MB", 1), ("GB", 2), ("TB", 2))
+
+
+def _format_size(size_bytes):
+    """
+    Format a byte count in human-readable form.
+    
+    Args:
+        size_bytes: Size in bytes
+        
+    Returns:
+        str: Size such as "512 B", "1.5 KB" or "2.25 GB"
+    """
+    # Each unit step is 10 bits; bit_length picks the step without comparisons
+    index = min(len(_SIZE_UNITS) - 1, max(size_bytes.bit_length() - 1, 0) // 10)
+    unit, decimals = _SIZE_UNITS[index]
+    return f"{size_bytes / (1 << (10 * index)):.{decimals}f} {unit}"
 
 
 class GradientWidget(QWidget):
@@ -55,8 +264,62 @@ class GradientWidget(QWidget):
         self.color_stops = color_stops  # List of (position, QColor) tuples
         self.setMinimumHeight(20)
         
+        # 256x1 colour lookup image for the band, built on first paint
+        self._lut_image = None
+        
+        # Rendered band and labels, reused until the size or theme changes
+        self._cache_pixmap = None
+        self._cache_key = None
+        
     def paintEvent(self, event):
+        ratio = self.devicePixelRatioF()
+        key = (self.width(), self.height(), ratio, self.palette().color(self.palette().Text).rgba())
+        if key != self._cache_key:
+            pixmap = QPixmap(self.size() * ratio)
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(Qt.transparent)
+            
+            pixmap_painter = QPainter(pixmap)
+            pixmap_painter.setFont(self.font())
+            self._render(pixmap_painter)
+            pixmap_painter.end()
+            
+            self._cache_pixmap = pixmap
+            self._cache_key = key
+        
         painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._cache_pixmap)
+        painter.end()
+    
+    def _build_lut(self):
+        """
+        Interpolate the colour stops into a 256x1 lookup image with NumPy.
+        
+        Returns:
+            QImage: One pixel per step from position 0.0 to 1.0
+        """
+        if self.color_stops:
+            stops = sorted(
+                ((position, color.getRgb()) for position, color in self.color_stops),
+                key=lambda stop: stop[0]
+            )
+        else:
+            stops = [(0.0, self.start_color.getRgb()), (1.0, self.end_color.getRgb())]
+        
+        # Interpolate each channel across 256 samples; np.interp pads the
+        # end colours outside the stops, as QGradient does
+        positions = np.array([position for position, _ in stops], dtype=float)
+        colors = np.array([rgba for _, rgba in stops], dtype=float)
+        samples = np.linspace(0.0, 1.0, 256)
+        lut = np.empty((256, 4), dtype=np.uint8)
+        for channel in range(4):
+            lut[:, channel] = np.rint(np.interp(samples, positions, colors[:, channel]))
+        
+        # Copy so the image owns its pixels once the buffer goes away
+        return QImage(lut.tobytes(), 256, 1, QImage.Format_RGBA8888).copy()
+    
+    def _render(self, painter):
+        """Draw the gradient band and min/max labels with the given painter."""
         painter.setRenderHint(QPainter.Antialiasing)
         
         # Get widget dimensions
@@ -81,19 +344,15 @@ class GradientWidget(QWidget):
         gradient_width = gradient_end_x - gradient_start_x
         
         if gradient_width > 0:
-            # Draw gradient in the middle section
-            gradient = QLinearGradient(gradient_start_x, 0, gradient_end_x, 0)
-            
-            if self.color_stops:
-                # Multi-stop gradient
-                for position, color in self.color_stops:
-                    gradient.setColorAt(position, color)
-            else:
-                # Simple two-color gradient
-                gradient.setColorAt(0, self.start_color)
-                gradient.setColorAt(1, self.end_color)
-            
-            painter.fillRect(gradient_start_x, 2, gradient_width, height - 4, gradient)
+            # Draw gradient in the middle section by stretching the lookup image
+            if self._lut_image is None:
+                self._lut_image = self._build_lut()
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawImage(
+                QRectF(gradient_start_x, 2, gradient_width, height - 4),
+                self._lut_image,
+                QRectF(0, 0, 256, 1)
+            )
         
         # Use palette text color (respects light/dark theme)
         painter.setPen(self.palette().color(self.palette().Text))
@@ -103,41 +362,162 @@ class GradientWidget(QWidget):
         
         # Draw max value on right
         painter.drawText(width - max_text_width - text_padding, height // 2 + 4, max_text)
-        
-        painter.end()
 
 
 class LayerTreeBuilder:
     """Builds and populates the layer tree widget with groups and layers."""
     
+    # Layer item counts for the current tree, kept up to date as items are
+    # built and filtered so the search box never rescans the tree to count
+    total_layers = 0
+    hidden_layers = 0
+    
+    # (item, widget) pairs for gradient items built while detached; the
+    # widgets are set once the items are in the tree widget
+    _pending_item_widgets = []
+    
+    @staticmethod
+    def reset_counts():
+        """Reset the layer counts and pending item widgets before the tree is rebuilt."""
+        LayerTreeBuilder.total_layers = 0
+        LayerTreeBuilder.hidden_layers = 0
+        LayerTreeBuilder._pending_item_widgets = []
+    
+    @staticmethod
+    def clear_source_cache():
+        """Forget cached layer source sizes; called before every rebuild."""
+        _SOURCE_SIZES.clear()
+    
+    @staticmethod
+    def shutdown_stat_pool():
+        """Stop the source stat worker threads; called when the dock closes."""
+        global _STAT_POOL
+        if _STAT_POOL is not None:
+            _STAT_POOL.shutdown(wait=False)
+            _STAT_POOL = None
+    
+    @staticmethod
+    def prefetch_source_sizes(node):
+        """
+        Stat the sources of all layers under a node in parallel.
+        
+        Only the file system calls run on worker threads; layer sources are
+        read on the calling (GUI) thread since map layers are not thread-safe.
+        The sizes land in the _SOURCE_SIZES cache used by add_layer_item;
+        sources already in it are skipped, and when fewer than two are left
+        the pool is not used at all.
+        
+        Args:
+            node: QgsLayerTreeGroup whose layers will be built
+        """
+        sources = set()
+        for layer_node in node.findLayers():
+            layer = layer_node.layer()
+            if layer and layer.isValid():
+                source = layer.source()
+                if source not in _SOURCE_SIZES:
+                    sources.add(source)
+        
+        if len(sources) < 2:
+            return
+        
+        # Results are stored on this thread, so the cache is never written
+        # from a worker
+        sources = list(sources)
+        _SOURCE_SIZES.update(zip(sources, _stat_pool().map(_stat_source, sources)))
+    
     @staticmethod
     def build_tree_from_node(node, parent_item, tree_widget, dialog=None):
         """
-        Recursively build tree from layer tree node.
+        Build tree from layer tree node.
+        
+        Nodes are walked with an explicit stack. Items are built detached and
+        each level is attached with a single addChildren/addTopLevelItems
+        call; the top level goes last, so the tree widget's model sees one
+        insertion per build rather than one per item.
         
         Args:
             node: QgsLayerTreeNode to process
             parent_item: Parent QTreeWidgetItem (None for root)
             tree_widget: QTreeWidget instance
-            dialog: LayersAdvancedDialog instance for logging (optional)
+            dialog: LayersAdvancedDialog instance for logging (optional);
+                errors are always logged, per-item trace messages only when
+                its debug_enabled is set
         """
-        if dialog:
-            dialog.log_debug(f"build_tree_from_node called, node has {len(node.children())} children")
-        for child in node.children():
-            if dialog:
-                dialog.log_debug(f"Processing child: {type(child).__name__}")
-            if isinstance(child, QgsLayerTreeGroup):
-                # Create group item
-                group_item = LayerTreeBuilder.add_group_item(child, parent_item, tree_widget)
-                # Recursively add children
-                LayerTreeBuilder.build_tree_from_node(child, group_item, tree_widget, dialog)
-            elif isinstance(child, QgsLayerTreeLayer):
-                # Add layer item
-                layer = child.layer()
-                if dialog:
-                    dialog.log_debug(f"Found layer node, layer={layer.name() if layer else 'None'}, isValid={layer.isValid() if layer else 'N/A'}")
-                if layer and layer.isValid():
-                    LayerTreeBuilder.add_layer_item(layer, parent_item, tree_widget, child, dialog)
+        # Decide once whether to trace, so no message is formatted otherwise
+        trace = _trace(dialog)
+        
+        # File sizes are I/O bound, so stat them all up front in parallel
+        if isinstance(node, QgsLayerTreeGroup):
+            LayerTreeBuilder.prefetch_source_sizes(node)
+        
+        # None marks the top level, attached to parent_item/tree_widget last
+        top_level = []
+        stack = [(node, None)]
+        while stack:
+            current_node, current_item = stack.pop()
+            children = current_node.children()
+            siblings = []
+            if trace:
+                trace.log_debug(f"build_tree_from_node processing node with {len(children)} children")
+            for child in children:
+                # Layer tree nodes are always exactly one of these concrete
+                # types, so an identity check on the type is enough
+                child_type = type(child)
+                if trace:
+                    trace.log_debug(f"Processing child: {child_type.__name__}")
+                if child_type is QgsLayerTreeGroup:
+                    # Create detached group item; its children are built
+                    # when the group comes off the stack
+                    group_item = LayerTreeBuilder.add_group_item(child, None, None)
+                    stack.append((child, group_item))
+                    siblings.append(group_item)
+                elif child_type is QgsLayerTreeLayer:
+                    # Add layer item
+                    layer = child.layer()
+                    if trace:
+                        trace.log_debug(f"Found layer node, layer={layer.name() if layer else 'None'}, isValid={layer.isValid() if layer else 'N/A'}")
+                    if layer and layer.isValid():
+                        siblings.append(
+                            LayerTreeBuilder.add_layer_item(layer, None, None, child, dialog)
+                        )
+            
+            if current_item is None:
+                top_level = siblings
+            else:
+                current_item.addChildren(siblings)
+        
+        # Attach the top level in one call
+        if parent_item:
+            parent_item.addChildren(top_level)
+        else:
+            tree_widget.addTopLevelItems(top_level)
+        
+        # Item widgets can only be set once their items are in the tree
+        if tree_widget and (parent_item is None or parent_item.treeWidget()):
+            for item, widget in LayerTreeBuilder._pending_item_widgets:
+                tree_widget.setItemWidget(item, 0, widget)
+            LayerTreeBuilder._pending_item_widgets = []
+    
+    @staticmethod
+    def _new_item(parent_item, tree_widget, texts):
+        """
+        Create a tree item with all of its column texts in one constructor call.
+        
+        Args:
+            parent_item: Parent QTreeWidgetItem, or None
+            tree_widget: QTreeWidget used when there is no parent_item, or None
+                for a detached item
+            texts: List of column texts
+            
+        Returns:
+            QTreeWidgetItem: Created item
+        """
+        if parent_item:
+            return QTreeWidgetItem(parent_item, texts)
+        if tree_widget:
+            return QTreeWidgetItem(tree_widget, texts)
+        return QTreeWidgetItem(texts)
     
     @staticmethod
     def add_group_item(group_node, parent_item, tree_widget):
@@ -147,36 +527,27 @@ class LayerTreeBuilder:
         Args:
             group_node: QgsLayerTreeGroup node
             parent_item: Parent QTreeWidgetItem (None for root)
-            tree_widget: QTreeWidget instance
+            tree_widget: QTreeWidget instance (None with no parent_item
+                for a detached item)
             
         Returns:
             QTreeWidgetItem: Created group item
         """
-        if parent_item:
-            item = QTreeWidgetItem(parent_item)
-        else:
-            item = QTreeWidgetItem(tree_widget)
-        
-        # Set group name
+        # Group name in the first column, the others empty
         group_name = group_node.name()
-        item.setText(0, group_name)
-        item.setData(0, Qt.ItemDataRole.UserRole, group_name)  # Store the group name to avoid dangling pointers
-        item.setData(0, Qt.ItemDataRole.UserRole + 1, "group")  # Mark as group
+        item = LayerTreeBuilder._new_item(parent_item, tree_widget, [group_name] + _EMPTY_COLUMNS)
+        item.setData(0, ROLE_ID, group_name)  # Store the group name to avoid dangling pointers
+        item.setData(0, ROLE_TYPE, "group")  # Mark as group
+        item.setData(0, ROLE_NAME_LOWER, group_name.lower())  # Cached for filtering
         
         # Set checkbox for visibility
         item.setCheckState(0, Qt.CheckState.Checked if group_node.isVisible() else Qt.CheckState.Unchecked)
         
         # Set folder icon
-        item.setIcon(0, QIcon(":/images/themes/default/mActionFolder.svg"))
+        item.setIcon(0, resource_icon(":/images/themes/default/mActionFolder.svg"))
         
         # Make text bold for groups
-        font = item.font(0)
-        font.setBold(True)
-        item.setFont(0, font)
-        
-        # Set other columns to empty
-        for col in range(1, 7):
-            item.setText(col, "")
+        item.setFont(0, _group_font())
         
         return item
     
@@ -188,114 +559,89 @@ class LayerTreeBuilder:
         Args:
             layer: QgsMapLayer to add
             parent_item: Parent QTreeWidgetItem (None for root)
-            tree_widget: QTreeWidget instance
+            tree_widget: QTreeWidget instance (None with no parent_item
+                for a detached item)
             layer_node: QgsLayerTreeLayer node (optional)
             dialog: LayersAdvancedDialog instance for logging (optional)
             
         Returns:
             QTreeWidgetItem: Created layer item
         """
-        if dialog:
-            dialog.log_debug(f"add_layer_item called for '{layer.name()}', type={type(layer).__name__}, isRasterLayer={isinstance(layer, QgsRasterLayer)}")
+        trace = _trace(dialog)
         
-        if parent_item:
-            item = QTreeWidgetItem(parent_item)
-        else:
-            item = QTreeWidgetItem(tree_widget)
+        # Layer type enum, read once for the icon and symbology dispatch
+        map_layer_type = layer.type()
+        if trace:
+            trace.log_debug(f"add_layer_item called for '{layer.name()}', type={type(layer).__name__}, isRasterLayer={map_layer_type == QgsMapLayer.RasterLayer}")
         
-        # Set layer name
-        item.setText(0, layer.name())
-        item.setData(0, Qt.ItemDataRole.UserRole, layer.id())
-        item.setData(0, Qt.ItemDataRole.UserRole + 1, "layer")  # Mark as layer
-        
-        # Set checkbox for visibility
-        if layer_node:
-            item.setCheckState(0, Qt.CheckState.Checked if layer_node.isVisible() else Qt.CheckState.Unchecked)
-        else:
-            item.setCheckState(0, Qt.CheckState.Checked if VisibilityService.is_layer_visible(layer) else Qt.CheckState.Unchecked)
+        layer_name = layer.name()
         
-        # Set layer type
+        # Layer type and feature count or size info
         layer_type = LayerService.get_layer_type_string(layer)
-        item.setText(1, layer_type)
-        
-        # Set feature count or size info
         info = LayerService.get_layer_info(layer)
-        item.setText(2, info)
         
-        # Set CRS
+        # CRS
         try:
-            crs = layer.crs().authid()
-            item.setText(3, crs if crs else "-")
+            crs = layer.crs().authid() or "-"
         except Exception:
-            item.setText(3, "-")
+            crs = "-"
         
-        # Set file type
+        # File type, file size and source from a single stat of the source
+        source = None
         try:
             source = layer.source()
-            import os
-            if os.path.exists(source):
-                ext = os.path.splitext(source)[1].upper()
-                item.setText(4, ext if ext else "-")
+            size_bytes = _source_size(source)
+            
+            if size_bytes is not None:
+                ext = os.path.splitext(source)[1].upper() or "-"
+                size_text = _format_size(size_bytes)
+                
+                # Extract filename for display
+                display_source = os.path.basename(source)
             else:
                 # For non-file sources, try to get provider type
                 try:
-                    provider = layer.providerType()
-                    item.setText(4, provider if provider else "-")
+                    ext = layer.providerType() or "-"
                 except Exception:
-                    item.setText(4, "-")
-        except Exception:
-            item.setText(4, "-")
-        
-        # Set file size
-        try:
-            source = layer.source()
-            import os
-            if os.path.exists(source):
-                size_bytes = os.path.getsize(source)
-                # Format size in human-readable format
-                if size_bytes < 1024:
-                    size_str = f"{size_bytes} B"
-                elif size_bytes < 1024 * 1024:
-                    size_str = f"{size_bytes / 1024:.1f} KB"
-                elif size_bytes < 1024 * 1024 * 1024:
-                    size_str = f"{size_bytes / (1024 * 1024):.1f} MB"
-                else:
-                    size_str = f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
-                item.setText(5, size_str)
-            else:
-                item.setText(5, "-")
+                    ext = "-"
+                size_text = "-"
+                display_source = source[:30] + "..." if len(source) > 30 else source
         except Exception:
-            item.setText(5, "-")
+            source = None
+            ext = size_text = display_source = "-"
         
-        # Set source path (truncated, full path in tooltip)
-        try:
-            source = layer.source()
-            # Extract filename or last part of path for display
-            import os
-            if os.path.exists(source):
-                display_source = os.path.basename(source)
-            else:
-                # For non-file sources (e.g., URLs, database connections)
-                display_source = source[:30] + "..." if len(source) > 30 else source
-            
-            item.setText(6, display_source)
+        # All column texts are set by the constructor
+        item = LayerTreeBuilder._new_item(
+            parent_item, tree_widget,
+            [layer_name, layer_type, info, crs, ext, size_text, display_source]
+        )
+        if source is not None:
             item.setToolTip(6, source)  # Full path on hover
-        except Exception:
-            item.setText(6, "-")
+        
+        item.setData(0, ROLE_ID, layer.id())
+        item.setData(0, ROLE_TYPE, "layer")  # Mark as layer
+        item.setData(0, ROLE_NAME_LOWER, layer_name.lower())  # Cached for filtering
+        LayerTreeBuilder.total_layers += 1
+        
+        # Set checkbox for visibility
+        if layer_node:
+            item.setCheckState(0, Qt.CheckState.Checked if layer_node.isVisible() else Qt.CheckState.Unchecked)
+        else:
+            item.setCheckState(0, Qt.CheckState.Checked if VisibilityService.is_layer_visible(layer) else Qt.CheckState.Unchecked)
         
         # Set icon based on layer type
-        icon = LayerTreeBuilder.get_layer_icon(layer)
+        icon = LayerTreeBuilder.get_layer_icon(layer, map_layer_type)
         if icon:
             item.setIcon(0, icon)
         
         # Add symbology children for vector layers
-        if isinstance(layer, QgsVectorLayer):
+        if map_layer_type == QgsMapLayer.VectorLayer:
             LayerTreeBuilder.add_symbology_items(layer, item, layer_node)
         
         # Add symbology children for raster layers
-        elif isinstance(layer, QgsRasterLayer):
-            if dialog:
-                dialog.log_debug(f"Calling add_raster_symbology_items for '{layer.name()}'")
+        elif map_layer_type == QgsMapLayer.RasterLayer:
+            if trace:
+                trace.log_debug(f"Calling add_raster_symbology_items for '{layer.name()}'")
             LayerTreeBuilder.add_raster_symbology_items(layer, item, layer_node, dialog)
         
         return item
@@ -313,135 +659,159 @@ class LayerTreeBuilder:
         try:
             renderer = vector_layer.renderer()
             
-            if isinstance(renderer, QgsCategorizedSymbolRenderer):
-                # Categorized renderer - add each category as a child
-                for i, category in enumerate(renderer.categories()):
-                    LayerTreeBuilder.add_category_item(category, i, parent_item, vector_layer, layer_node)
-            
-            elif isinstance(renderer, QgsGraduatedSymbolRenderer):
-                # Graduated renderer - add each range as a child
-                for i, range_item in enumerate(renderer.ranges()):
-                    LayerTreeBuilder.add_range_item(range_item, i, parent_item, vector_layer, layer_node)
-            
-            elif isinstance(renderer, QgsSingleSymbolRenderer):
-                # Single symbol - show the symbol icon next to layer name (not as child)
-                symbol = renderer.symbol()
-                if symbol:
-                    icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer)
-                    if icon:
-                        parent_item.setIcon(0, icon)
-            
-            elif isinstance(renderer, QgsRuleBasedRenderer):
-                # Rule-based renderer - add each rule as a child
-                root_rule = renderer.rootRule()
-                if root_rule:
-                    for rule in root_rule.children():
-                        LayerTreeBuilder.add_rule_item(rule, parent_item, vector_layer, layer_node)
+            # Look up the builder for this renderer type; other renderers
+            # get no symbology children
+            builder = _symbology_builder(_VECTOR_SYMBOLOGY_BUILDERS, renderer)
+            if builder:
+                builder(renderer, parent_item, vector_layer, layer_node)
         
         except Exception as e:
             # Silently fail if symbology can't be loaded
             pass
     
+    @staticmethod
+    def _add_categorized_items(renderer, parent_item, vector_layer, layer_node):
+        """Categorized renderer - add each category as a child."""
+        for index, category in enumerate(renderer.categories()):
+            LayerTreeBuilder.add_category_item(category, index, parent_item, vector_layer, layer_node)
+    
+    @staticmethod
+    def _add_graduated_items(renderer, parent_item, vector_layer, layer_node):
+        """Graduated renderer - add each range as a child."""
+        for index, range_item in enumerate(renderer.ranges()):
+            LayerTreeBuilder.add_range_item(range_item, index, parent_item, vector_layer, layer_node)
+    
+    @staticmethod
+    def _add_single_symbol_icon(renderer, parent_item, vector_layer, layer_node):
+        """Single symbol - show the symbol icon next to layer name (not as child)."""
+        symbol = renderer.symbol()
+        if symbol:
+            icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer)
+            if icon:
+                parent_item.setIcon(0, icon)
+    
+    @staticmethod
+    def _add_rule_items(renderer, parent_item, vector_layer, layer_node):
+        """Rule-based renderer - add each rule as a child."""
+        root_rule = renderer.rootRule()
+        if root_rule:
+            LayerTreeBuilder.add_rule_items(root_rule.children(), parent_item, vector_layer, layer_node)
+    
+    @staticmethod
+    def _make_child(parent_item, label, layer_id, kind, extra=None, icon=None, checked=None):
+        """
+        Create a symbology child item with the smaller child font.
+        
+        Args:
+            parent_item: Parent QTreeWidgetItem (usually the layer item), or
+                None to create a detached item
+            label: Text for column 0
+            layer_id: ID of the owning layer, stored in ROLE_ID
+            kind: Item type string, stored in ROLE_TYPE
+            extra: Optional index or rule key, stored in ROLE_KEY
+            icon: Optional QIcon
+            checked: Optional bool; when given, the item gets a checkbox
+            
+        Returns:
+            QTreeWidgetItem: Created item
+        """
+        item = QTreeWidgetItem(parent_item)
+        item.setText(0, label)
+        if icon:
+            item.setIcon(0, icon)
+        if checked is not None:
+            item.setCheckState(0, Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+        item.setData(0, ROLE_ID, layer_id)
+        item.setData(0, ROLE_TYPE, kind)
+        if extra is not None:
+            item.setData(0, ROLE_KEY, extra)
+        item.setFont(0, _child_font())
+        return item
+    
     @staticmethod
     def add_category_item(category, index, parent_item, vector_layer, layer_node):
-        """Add a categorized symbol item as a child."""
+        """
+        Add a categorized symbol item as a child.
+        
+        The category's renderer index is stored in ROLE_KEY, so it stays
+        correct if an earlier category could not be added.
+        """
         try:
-            item = QTreeWidgetItem(parent_item)
-            
-            # Set category label
-            label = category.label() if category.label() else str(category.value())
-            item.setText(0, label)
-            
-            # Set symbol icon
+            label = category.label() or str(category.value())
             symbol = category.symbol()
-            if symbol:
-                icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer)
-                if icon:
-                    item.setIcon(0, icon)
+            icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer) if symbol else None
             
-            # Make checkbox for category visibility
-            item.setCheckState(0, Qt.CheckState.Checked if category.renderState() else Qt.CheckState.Unchecked)
-            
-            # Store category info
-            item.setData(0, Qt.ItemDataRole.UserRole, vector_layer.id())
-            item.setData(0, Qt.ItemDataRole.UserRole + 1, "category")
-            item.setData(0, Qt.ItemDataRole.UserRole + 2, index)  # Store category index
-            
-            # Make text slightly smaller/lighter for categories
-            font = item.font(0)
-            font.setPointSize(font.pointSize() - 1)
-            item.setFont(0, font)
+            # Checkbox reflects category visibility
+            LayerTreeBuilder._make_child(
+                parent_item, label, vector_layer.id(), "category",
+                extra=index, icon=icon, checked=category.renderState()
+            )
             
         except Exception:
             pass
     
     @staticmethod
     def add_range_item(range_item, index, parent_item, vector_layer, layer_node):
-        """Add a graduated symbol range item as a child."""
+        """
+        Add a graduated symbol range item as a child.
+        
+        The range's renderer index is stored in ROLE_KEY, so it stays
+        correct if an earlier range could not be added.
+        """
         try:
-            item = QTreeWidgetItem(parent_item)
-            
-            # Set range label
-            label = range_item.label() if range_item.label() else f"{range_item.lowerValue()} - {range_item.upperValue()}"
-            item.setText(0, label)
-            
-            # Set symbol icon
+            label = range_item.label() or f"{range_item.lowerValue()} - {range_item.upperValue()}"
             symbol = range_item.symbol()
-            if symbol:
-                icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer)
-                if icon:
-                    item.setIcon(0, icon)
-            
-            # Make checkbox for range visibility
-            item.setCheckState(0, Qt.CheckState.Checked if range_item.renderState() else Qt.CheckState.Unchecked)
+            icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer) if symbol else None
             
-            # Store range info
-            item.setData(0, Qt.ItemDataRole.UserRole, vector_layer.id())
-            item.setData(0, Qt.ItemDataRole.UserRole + 1, "range")
-            item.setData(0, Qt.ItemDataRole.UserRole + 2, index)  # Store range index
-            
-            # Make text slightly smaller/lighter
-            font = item.font(0)
-            font.setPointSize(font.pointSize() - 1)
-            item.setFont(0, font)
+            # Checkbox reflects range visibility
+            LayerTreeBuilder._make_child(
+                parent_item, label, vector_layer.id(), "range",
+                extra=index, icon=icon, checked=range_item.renderState()
+            )
             
         except Exception:
             pass
     
     @staticmethod
-    def add_rule_item(rule, parent_item, vector_layer, layer_node):
-        """Add a rule-based renderer rule item as a child."""
+    def add_rule_items(rules, parent_item, vector_layer, layer_node):
+        """
+        Add rule-based renderer rules, and their child rules, under a parent item.
+        
+        The rule tree is walked with an explicit stack. Each sibling list is
+        built as detached items and attached with a single addChildren call.
+        
+        Args:
+            rules: List of QgsRuleBasedRenderer.Rule to add
+            parent_item: Parent QTreeWidgetItem (the layer item)
+            vector_layer: The vector layer owning the renderer
+            layer_node: QgsLayerTreeLayer node of the layer
+        """
         try:
-            item = QTreeWidgetItem(parent_item)
-            
-            # Set rule label
-            label = rule.label() if rule.label() else rule.filterExpression()
-            item.setText(0, label if label else "Rule")
-            
-            # Set symbol icon
-            symbol = rule.symbol()
-            if symbol:
-                icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer)
-                if icon:
-                    item.setIcon(0, icon)
-            
-            # Make checkbox for rule visibility
-            item.setCheckState(0, Qt.CheckState.Checked if rule.active() else Qt.CheckState.Unchecked)
+            layer_id = vector_layer.id()
             
-            # Store rule info
-            item.setData(0, Qt.ItemDataRole.UserRole, vector_layer.id())
-            item.setData(0, Qt.ItemDataRole.UserRole + 1, "rule")
-            item.setData(0, Qt.ItemDataRole.UserRole + 2, rule.ruleKey())
-            
-            # Make text slightly smaller/lighter
-            font = item.font(0)
-            font.setPointSize(font.pointSize() - 1)
-            item.setFont(0, font)
-            
-            # Recursively add child rules
-            if rule.children():
-                for child_rule in rule.children():
-                    LayerTreeBuilder.add_rule_item(child_rule, item, vector_layer, layer_node)
+            stack = [(rules, parent_item)]
+            while stack:
+                rules, parent_item = stack.pop()
+                
+                items = []
+                for rule in rules:
+                    label = rule.label() or rule.filterExpression() or "Rule"
+                    symbol = rule.symbol()
+                    icon = LayerTreeBuilder.create_symbol_icon(symbol, vector_layer) if symbol else None
+                    
+                    # Checkbox reflects rule visibility; the rule key finds it again
+                    item = LayerTreeBuilder._make_child(
+                        None, label, layer_id, "rule",
+                        extra=rule.ruleKey(), icon=icon, checked=rule.active()
+                    )
+                    items.append(item)
+                    
+                    # Queue child rules
+                    child_rules = rule.children()
+                    if child_rules:
+                        stack.append((child_rules, item))
+                
+                parent_item.addChildren(items)
             
         except Exception:
             pass
@@ -459,16 +829,23 @@ class LayerTreeBuilder:
             QIcon or None
         """
         try:
-            # Create a small pixmap for the symbol
-            size = QSize(16, 16)
-            pixmap = QPixmap(size)
-            pixmap.fill(Qt.transparent)
+            key = QgsSymbolLayerUtils.symbolProperties(symbol)
+            icon = _SYMBOL_ICON_CACHE.get(key)
+            if icon is not None:
+                return icon
+            
+            # Copy a blank pixmap for the symbol rather than allocate and fill one
+            pixmap = _blank_icon_pixmap().copy()
             
             painter = QPainter(pixmap)
-            symbol.drawPreviewIcon(painter, size)
+            symbol.drawPreviewIcon(painter, _ICON_SIZE)
             painter.end()
             
-            return QIcon(pixmap)
+            # Start over rather than track usage once the cache is full
+            if len(_SYMBOL_ICON_CACHE) >= _SYMBOL_ICON_CACHE_SIZE:
+                _SYMBOL_ICON_CACHE.clear()
+            icon = _SYMBOL_ICON_CACHE[key] = QIcon(pixmap)
+            return icon
         except Exception:
             return None
     
@@ -483,78 +860,41 @@ class LayerTreeBuilder:
             layer_node: QgsLayerTreeLayer node
             dialog: LayersAdvancedDialog instance for logging (optional)
         """
+        trace = _trace(dialog)
         try:
-            if dialog:
-                dialog.log_debug(f"add_raster_symbology_items called for layer: {raster_layer.name()}")
+            if trace:
+                trace.log_debug(f"add_raster_symbology_items called for layer: {raster_layer.name()}")
             renderer = raster_layer.renderer()
-            if dialog:
-                dialog.log_debug(f"Renderer type: {type(renderer).__name__}")
-            
-            if isinstance(renderer, QgsPalettedRasterRenderer):
-                if dialog:
-                    dialog.log_debug("Detected QgsPalettedRasterRenderer")
-                # Paletted/categorized raster - show each class
-                classes = renderer.classes()
-                for i, raster_class in enumerate(classes):
-                    LayerTreeBuilder.add_raster_palette_item(raster_class, i, parent_item, raster_layer)
-            
-            elif isinstance(renderer, QgsSingleBandPseudoColorRenderer):
-                if dialog:
-                    dialog.log_debug("Detected QgsSingleBandPseudoColorRenderer")
-                # Pseudocolor (gradient) - show color ramp bar
-                LayerTreeBuilder.add_raster_gradient_item(renderer, parent_item, raster_layer, dialog)
-            
-            elif isinstance(renderer, QgsSingleBandGrayRenderer):
-                if dialog:
-                    dialog.log_debug("Detected QgsSingleBandGrayRenderer")
-                # Grayscale - show gradient bar
-                LayerTreeBuilder.add_raster_gray_gradient_item(renderer, parent_item, raster_layer, dialog)
-            
-            elif isinstance(renderer, QgsMultiBandColorRenderer):
-                if dialog:
-                    dialog.log_debug("Detected QgsMultiBandColorRenderer")
-                # Multiband color (RGB) - show a simple indicator
-                LayerTreeBuilder.add_raster_rgb_item(renderer, parent_item, raster_layer)
-            
-            elif isinstance(renderer, QgsRasterContourRenderer):
-                if dialog:
-                    dialog.log_debug("Detected QgsRasterContourRenderer")
-                # Contour renderer - show contour levels
-                LayerTreeBuilder.add_raster_contour_items(renderer, parent_item, raster_layer, dialog)
-            
-            else:
-                if dialog:
-                    dialog.log_debug(f"Unknown renderer type: {type(renderer).__name__}")
+            if trace:
+                trace.log_debug(f"Renderer type: {type(renderer).__name__}")
+            
+            # Look up the builder for this renderer type
+            builder = _symbology_builder(_RASTER_SYMBOLOGY_BUILDERS, renderer)
+            if builder:
+                builder(renderer, parent_item, raster_layer, dialog)
+            elif trace:
+                trace.log_debug(f"Unknown renderer type: {type(renderer).__name__}")
         
         except Exception as e:
             print(f"DEBUG ERROR in add_raster_symbology_items: {e}")
-            import traceback
             traceback.print_exc()
     
+    @staticmethod
+    def _add_raster_palette_items(renderer, parent_item, raster_layer, dialog=None):
+        """Paletted/categorized raster - add each class as a child."""
+        for i, raster_class in enumerate(renderer.classes()):
+            LayerTreeBuilder.add_raster_palette_item(raster_class, i, parent_item, raster_layer)
+    
     @staticmethod
     def add_raster_palette_item(raster_class, index, parent_item, raster_layer):
         """Add a paletted raster class item as a child."""
         try:
-            item = QTreeWidgetItem(parent_item)
-            
-            # Set class label
-            label = raster_class.label if raster_class.label else str(raster_class.value)
-            item.setText(0, label)
+            label = raster_class.label or str(raster_class.value)
             
-            # Create color icon
-            pixmap = QPixmap(16, 16)
-            pixmap.fill(raster_class.color)
-            item.setIcon(0, QIcon(pixmap))
-            
-            # Store class info
-            item.setData(0, Qt.ItemDataRole.UserRole, raster_layer.id())
-            item.setData(0, Qt.ItemDataRole.UserRole + 1, "raster_palette")
-            item.setData(0, Qt.ItemDataRole.UserRole + 2, index)
-            
-            # Make text slightly smaller
-            font = item.font(0)
-            font.setPointSize(font.pointSize() - 1)
-            item.setFont(0, font)
+            LayerTreeBuilder._make_child(
+                parent_item, label, raster_layer.id(), "raster_palette",
+                extra=index, icon=_swatch_icon(raster_class.color)
+            )
             
         except Exception:
             pass
@@ -562,17 +902,18 @@ class LayerTreeBuilder:
     @staticmethod
     def add_raster_contour_items(renderer, parent_item, raster_layer, dialog=None):
         """Add contour levels as list items."""
+        trace = _trace(dialog)
         try:
-            if dialog:
-                dialog.log_debug(f"add_raster_contour_items called for {raster_layer.name()}")
+            if trace:
+                trace.log_debug(f"add_raster_contour_items called for {raster_layer.name()}")
             
             # Get contour interval and index interval
             contour_interval = renderer.contourInterval()
             index_interval = renderer.contourIndexInterval()
             
-            if dialog:
-                dialog.log_debug(f"  contour_interval = {contour_interval}")
-                dialog.log_debug(f"  index_interval = {index_interval}")
+            if trace:
+                trace.log_debug(f"  contour_interval = {contour_interval}")
+                trace.log_debug(f"  index_interval = {index_interval}")
             
             # Get contour symbol (line style)
             contour_symbol = renderer.contourSymbol()
@@ -580,149 +921,101 @@ class LayerTreeBuilder:
             
             # Add contour interval item
             if contour_interval > 0:
-                item = QTreeWidgetItem(parent_item)
-                item.setText(0, f"Interval: {contour_interval}")
-                
                 # Get line color from symbol if available
-                if contour_symbol:
-                    color = contour_symbol.color()
-                    pixmap = QPixmap(16, 16)
-                    pixmap.fill(Qt.transparent)
-                    painter = QPainter(pixmap)
-                    painter.setPen(color)
-                    painter.drawLine(0, 8, 16, 8)
-                    painter.end()
-                    item.setIcon(0, QIcon(pixmap))
-                
-                # Make text slightly smaller
-                font = item.font(0)
-                font.setPointSize(font.pointSize() - 1)
-                item.setFont(0, font)
-                
-                item.setData(0, Qt.ItemDataRole.UserRole, raster_layer.id())
-                item.setData(0, Qt.ItemDataRole.UserRole + 1, "raster_contour")
+                icon = _line_icon(contour_symbol.color(), 1) if contour_symbol else None
+                LayerTreeBuilder._make_child(
+                    parent_item, f"Interval: {contour_interval}", raster_layer.id(),
+                    "raster_contour", icon=icon
+                )
             
             # Add index contour item if different
             if index_interval > 0 and index_interval != contour_interval:
-                item = QTreeWidgetItem(parent_item)
-                item.setText(0, f"Index Interval: {index_interval}")
-                
-                # Get line color from index symbol if available
-                if index_symbol:
-                    color = index_symbol.color()
-                    pixmap = QPixmap(16, 16)
-                    pixmap.fill(Qt.transparent)
-                    painter = QPainter(pixmap)
-                    pen = painter.pen()
-                    pen.setColor(color)
-                    pen.setWidth(2)  # Thicker line for index contours
-                    painter.setPen(pen)
-                    painter.drawLine(0, 8, 16, 8)
-                    painter.end()
-                    item.setIcon(0, QIcon(pixmap))
-                
-                # Make text slightly smaller
-                font = item.font(0)
-                font.setPointSize(font.pointSize() - 1)
-                item.setFont(0, font)
-                
-                item.setData(0, Qt.ItemDataRole.UserRole, raster_layer.id())
-                item.setData(0, Qt.ItemDataRole.UserRole + 1, "raster_contour_index")
-            
-            if dialog:
-                dialog.log_debug(f"  Added contour items")
+                # Get line color from index symbol if available; thicker
+                # line for index contours
+                icon = _line_icon(index_symbol.color(), 2) if index_symbol else None
+                LayerTreeBuilder._make_child(
+                    parent_item, f"Index Interval: {index_interval}", raster_layer.id(),
+                    "raster_contour_index", icon=icon
+                )
+            
+            if trace:
+                trace.log_debug(f"  Added contour items")
         
         except Exception as e:
             if dialog:
                 dialog.log_debug(f"Error in add_raster_contour_items: {e}")
-            import traceback
             traceback.print_exc()
     
     @staticmethod
     def add_raster_discrete_items(raster_shader, parent_item, raster_layer, dialog=None):
         """Add discrete color ramp items as a list (similar to vector categories)."""
+        trace = _trace(dialog)
         try:
-            if dialog:
-                dialog.log_debug(f"add_raster_discrete_items called for {raster_layer.name()}")
+            if trace:
+                trace.log_debug(f"add_raster_discrete_items called for {raster_layer.name()}")
             
             # Get the color ramp items
             if not hasattr(raster_shader, 'colorRampItemList'):
-                if dialog:
-                    dialog.log_debug("No colorRampItemList method available")
+                if trace:
+                    trace.log_debug("No colorRampItemList method available")
                 return
             
             ramp_items = raster_shader.colorRampItemList()
-            if dialog:
-                dialog.log_debug(f"Found {len(ramp_items)} discrete color ramp items")
+            if trace:
+                trace.log_debug(f"Found {len(ramp_items)} discrete color ramp items")
             
             # Add each item as a separate row
+            layer_id = raster_layer.id()
             for index, ramp_item in enumerate(ramp_items):
-                item = QTreeWidgetItem(parent_item)
-                
                 # Format label based on whether it has a label or just value
-                if ramp_item.label:
-                    label = ramp_item.label
-                else:
-                    label = str(ramp_item.value)
-                
-                item.setText(0, label)
-                
-                # Create color icon (square swatch like vector categories)
-                pixmap = QPixmap(16, 16)
-                pixmap.fill(ramp_item.color)
-                item.setIcon(0, QIcon(pixmap))
+                label = ramp_item.label or str(ramp_item.value)
                 
-                # Store item info
-                item.setData(0, Qt.ItemDataRole.UserRole, raster_layer.id())
-                item.setData(0, Qt.ItemDataRole.UserRole + 1, "raster_discrete")
-                item.setData(0, Qt.ItemDataRole.UserRole + 2, index)
+                # Square colour swatch like vector categories
+                LayerTreeBuilder._make_child(
+                    parent_item, label, layer_id, "raster_discrete",
+                    extra=index, icon=_swatch_icon(ramp_item.color)
+                )
                 
-                # Make text slightly smaller to match other symbology items
-                font = item.font(0)
-                font.setPointSize(font.pointSize() - 1)
-                item.setFont(0, font)
-                
-                if dialog:
-                    dialog.log_debug(f"  Added discrete item: {label} = {ramp_item.color.name()}")
+                if trace:
+                    trace.log_debug(f"  Added discrete item: {label} = {ramp_item.color.name()}")
         
         except Exception as e:
             if dialog:
                 dialog.log_debug(f"Error in add_raster_discrete_items: {e}")
-            import traceback
             traceback.print_exc()
     
     @staticmethod
     def add_raster_gradient_item(renderer, parent_item, raster_layer, dialog=None):
         """Add a gradient bar for pseudocolor raster (or discrete list for Discrete/Exact modes)."""
+        trace = _trace(dialog)
         try:
-            if dialog:
-                dialog.log_debug(f"add_raster_gradient_item called for {raster_layer.name()}")
+            if trace:
+                trace.log_debug(f"add_raster_gradient_item called for {raster_layer.name()}")
             
             # Get shader and color ramp
             shader = renderer.shader()
-            if dialog:
-                dialog.log_debug(f"shader = {shader}")
+            if trace:
+                trace.log_debug(f"shader = {shader}")
             if not shader:
-                if dialog:
-                    dialog.log_debug("No shader found!")
+                if trace:
+                    trace.log_debug("No shader found!")
                 return
             
             raster_shader = shader.rasterShaderFunction()
-            if dialog:
-                dialog.log_debug(f"raster_shader = {raster_shader}")
+            if trace:
+                trace.log_debug(f"raster_shader = {raster_shader}")
             if not raster_shader:
-                if dialog:
-                    dialog.log_debug("No raster shader function!")
+                if trace:
+                    trace.log_debug("No raster shader function!")
                 return
             
             # Check interpolation type
-            from qgis.core import QgsColorRampShader
             color_ramp_type = raster_shader.colorRampType()
-            if dialog:
-                dialog.log_debug(f"color_ramp_type = {color_ramp_type}")
+            if trace:
+                trace.log_debug(f"color_ramp_type = {color_ramp_type}")
             
             # If Discrete or Exact, show as list items instead of gradient
-            if color_ramp_type in (QgsColorRampShader.Discrete, QgsColorRampShader.Exact):
+            if color_ramp_type in _DISCRETE_EXACT:
                 LayerTreeBuilder.add_raster_discrete_items(raster_shader, parent_item, raster_layer, dialog)
                 return
             
@@ -732,8 +1025,8 @@ class LayerTreeBuilder:
             # Get min/max values
             min_val = raster_shader.minimumValue()
             max_val = raster_shader.maximumValue()
-            if dialog:
-                dialog.log_debug(f"min_val = {min_val}, max_val = {max_val}")
+            if trace:
+                trace.log_debug(f"min_val = {min_val}, max_val = {max_val}")
             
             # Get color ramp items (the color stops)
             color_stops = []
@@ -741,21 +1034,24 @@ class LayerTreeBuilder:
                 # Try to get the color ramp items which define the stops
                 if hasattr(raster_shader, 'colorRampItemList'):
                     ramp_items = raster_shader.colorRampItemList()
-                    if dialog:
-                        dialog.log_debug(f"Found {len(ramp_items)} color ramp items")
+                    if trace:
+                        trace.log_debug(f"Found {len(ramp_items)} color ramp items")
                     
-                    # Convert ramp items to normalized positions (0.0-1.0)
+                    # Convert ramp items to normalized positions (0.0-1.0),
+                    # clamped to that range, in one pass over all values
                     value_range = max_val - min_val
-                    if value_range > 0:
-                        for ramp_item in ramp_items:
-                            value = ramp_item.value
-                            color = ramp_item.color
-                            position = (value - min_val) / value_range
-                            # Clamp position to 0.0-1.0 range
-                            position = max(0.0, min(1.0, position))
-                            color_stops.append((position, color))
-                            if dialog:
-                                dialog.log_debug(f"  Stop at {position:.3f} ({value:.2f}): {color.name()}")
+                    if value_range > 0 and ramp_items:
+                        values = np.fromiter(
+                            (ramp_item.value for ramp_item in ramp_items),
+                            dtype=np.float64, count=len(ramp_items)
+                        )
+                        positions = np.clip((values - min_val) / value_range, 0.0, 1.0)
+                        color_stops = list(zip(
+                            positions.tolist(), (ramp_item.color for ramp_item in ramp_items)
+                        ))
+                        if trace:
+                            for (position, color), value in zip(color_stops, values.tolist()):
+                                trace.log_debug(f"  Stop at {position:.3f} ({value:.2f}): {color.name()}")
             except Exception as e:
                 if dialog:
                     dialog.log_debug(f"Error getting color ramp items: {e}")
@@ -763,20 +1059,20 @@ class LayerTreeBuilder:
             # Fallback: get the source color ramp and sample it
             if not color_stops:
                 color_ramp = raster_shader.sourceColorRamp()
-                if dialog:
-                    dialog.log_debug(f"color_ramp = {color_ramp}")
+                if trace:
+                    trace.log_debug(f"color_ramp = {color_ramp}")
                 
                 if color_ramp:
                     # Sample the color ramp at regular intervals
                     start_color = color_ramp.color(0.0)
                     end_color = color_ramp.color(1.0)
                     
-                    if dialog:
-                        dialog.log_debug(f"Fallback: sampling ramp - start: {start_color.name()}, end: {end_color.name()}")
+                    if trace:
+                        trace.log_debug(f"Fallback: sampling ramp - start: {start_color.name()}, end: {end_color.name()}")
                 else:
                     # No color information available
-                    if dialog:
-                        dialog.log_debug("No color ramp available")
+                    if trace:
+                        trace.log_debug("No color ramp available")
                     item.setText(0, f"{min_val:.2f} - {max_val:.2f}")
                     return
             
@@ -786,13 +1082,13 @@ class LayerTreeBuilder:
                 start_color = color_stops[0][1]
                 end_color = color_stops[-1][1]
                 gradient_widget = GradientWidget(start_color, end_color, min_val, max_val, color_stops=color_stops)
-                if dialog:
-                    dialog.log_debug(f"Created GradientWidget with {len(color_stops)} color stops")
+                if trace:
+                    trace.log_debug(f"Created GradientWidget with {len(color_stops)} color stops")
             else:
                 # Fallback to simple two-color gradient
                 gradient_widget = GradientWidget(start_color, end_color, min_val, max_val)
-                if dialog:
-                    dialog.log_debug("Created simple GradientWidget")
+                if trace:
+                    trace.log_debug("Created simple GradientWidget")
             
             # Set empty text for the item (widget will display everything)
             item.setText(0, "")
@@ -801,40 +1097,41 @@ class LayerTreeBuilder:
             tree_widget = parent_item.treeWidget() if parent_item else None
             if tree_widget:
                 tree_widget.setItemWidget(item, 0, gradient_widget)
-                if dialog:
-                    dialog.log_debug("Set item widget")
+                if trace:
+                    trace.log_debug("Set item widget")
+            else:
+                # Layer item is still detached; set the widget once attached
+                LayerTreeBuilder._pending_item_widgets.append((item, gradient_widget))
             
             # Store info
-            item.setData(0, Qt.ItemDataRole.UserRole, raster_layer.id())
-            item.setData(0, Qt.ItemDataRole.UserRole + 1, "raster_pseudocolor")
+            item.setData(0, ROLE_ID, raster_layer.id())
+            item.setData(0, ROLE_TYPE, "raster_pseudocolor")
             
         except Exception as e:
             if dialog:
                 dialog.log_debug(f"ERROR in add_raster_gradient_item: {e}")
-            import traceback
             traceback.print_exc()
     
     @staticmethod
     def add_raster_gray_gradient_item(renderer, parent_item, raster_layer, dialog=None):
         """Add a grayscale gradient bar."""
-        from qgis.core import QgsRasterShader, QgsColorRampShader
-        
+        trace = _trace(dialog)
         try:
-            if dialog:
-                dialog.log_debug(f"add_raster_gray_gradient_item called for {raster_layer.name()}")
+            if trace:
+                trace.log_debug(f"add_raster_gray_gradient_item called for {raster_layer.name()}")
             item = QTreeWidgetItem(parent_item)
             
             # Get min/max values from the raster
             # Use inputBand() instead of deprecated grayBand()
             try:
                 band = renderer.inputBand()
-                if dialog:
-                    dialog.log_debug(f"band = {band} (from inputBand)")
+                if trace:
+                    trace.log_debug(f"band = {band} (from inputBand)")
             except AttributeError:
                 # Fallback for older QGIS versions
                 band = renderer.grayBand()
-                if dialog:
-                    dialog.log_debug(f"band = {band} (from grayBand)")
+                if trace:
+                    trace.log_debug(f"band = {band} (from grayBand)")
             
             provider = raster_layer.dataProvider()
             
@@ -844,13 +1141,13 @@ class LayerTreeBuilder:
             
             try:
                 contrast_enhancement = renderer.contrastEnhancement()
-                if dialog:
-                    dialog.log_debug(f"contrast_enhancement = {contrast_enhancement}")
+                if trace:
+                    trace.log_debug(f"contrast_enhancement = {contrast_enhancement}")
                 if contrast_enhancement:
                     min_val = contrast_enhancement.minimumValue()
                     max_val = contrast_enhancement.maximumValue()
-                    if dialog:
-                        dialog.log_debug(f"From contrast enhancement - min: {min_val}, max: {max_val}")
+                    if trace:
+                        trace.log_debug(f"From contrast enhancement - min: {min_val}, max: {max_val}")
             except Exception as ce_ex:
                 if dialog:
                     dialog.log_debug(f"Error getting contrast enhancement: {ce_ex}")
@@ -861,16 +1158,16 @@ class LayerTreeBuilder:
                     stats = provider.bandStatistics(band)
                     min_val = stats.minimumValue
                     max_val = stats.maximumValue
-                    if dialog:
-                        dialog.log_debug(f"From band stats - min: {min_val}, max: {max_val}")
+                    if trace:
+                        trace.log_debug(f"From band stats - min: {min_val}, max: {max_val}")
                 except Exception as stats_ex:
                     if dialog:
                         dialog.log_debug(f"Error getting band stats: {stats_ex}")
                     # Last resort defaults
                     min_val = 0
                     max_val = 255
-                    if dialog:
-                        dialog.log_debug(f"Using defaults - min: {min_val}, max: {max_val}")
+                    if trace:
+                        trace.log_debug(f"Using defaults - min: {min_val}, max: {max_val}")
             
             # Determine gradient colors based on renderer settings
             start_color = QColor(0, 0, 0)  # Default black
@@ -880,27 +1177,27 @@ class LayerTreeBuilder:
             try:
                 # Access the gradient property (BlackToWhite=0, WhiteToBlack=1)
                 gradient_mode = renderer.gradient()
-                if dialog:
-                    dialog.log_debug(f"gradient_mode = {gradient_mode}")
+                if trace:
+                    trace.log_debug(f"gradient_mode = {gradient_mode}")
                 if gradient_mode == 1:  # WhiteToBlack
                     start_color = QColor(255, 255, 255)
                     end_color = QColor(0, 0, 0)
-                    if dialog:
-                        dialog.log_debug("Using WhiteToBlack gradient")
+                    if trace:
+                        trace.log_debug("Using WhiteToBlack gradient")
                 else:
-                    if dialog:
-                        dialog.log_debug("Using BlackToWhite gradient")
+                    if trace:
+                        trace.log_debug("Using BlackToWhite gradient")
             except Exception as grad_ex:
                 if dialog:
                     dialog.log_debug(f"Error getting gradient mode: {grad_ex}")
             
-            if dialog:
-                dialog.log_debug(f"Final colors - start: {start_color.name()}, end: {end_color.name()}")
+            if trace:
+                trace.log_debug(f"Final colors - start: {start_color.name()}, end: {end_color.name()}")
             
             # Create custom gradient widget
             gradient_widget = GradientWidget(start_color, end_color, min_val, max_val)
-            if dialog:
-                dialog.log_debug("Created GradientWidget")
+            if trace:
+                trace.log_debug("Created GradientWidget")
             
             # Set empty text for the item (widget will display everything)
             item.setText(0, "")
@@ -909,70 +1206,105 @@ class LayerTreeBuilder:
             tree_widget = parent_item.treeWidget() if parent_item else None
             if tree_widget:
                 tree_widget.setItemWidget(item, 0, gradient_widget)
-                if dialog:
-                    dialog.log_debug("Set item widget")
+                if trace:
+                    trace.log_debug("Set item widget")
+            else:
+                # Layer item is still detached; set the widget once attached
+                LayerTreeBuilder._pending_item_widgets.append((item, gradient_widget))
             
             # Store info
-            item.setData(0, Qt.ItemDataRole.UserRole, raster_layer.id())
-            item.setData(0, Qt.ItemDataRole.UserRole + 1, "raster_gray")
+            item.setData(0, ROLE_ID, raster_layer.id())
+            item.setData(0, ROLE_TYPE, "raster_gray")
             
         except Exception as e:
             print(f"DEBUG ERROR in add_raster_gray_gradient_item: {e}")
-            import traceback
             traceback.print_exc()
             pass
     
     @staticmethod
-    def add_raster_rgb_item(renderer, parent_item, raster_layer):
+    def add_raster_rgb_item(renderer, parent_item, raster_layer, dialog=None):
         """Add an RGB indicator for multiband color raster."""
         try:
-            item = QTreeWidgetItem(parent_item)
-            
             # Get band assignments
             red_band = renderer.redBand()
             green_band = renderer.greenBand()
             blue_band = renderer.blueBand()
             
-            item.setText(0, f"RGB: {red_band}, {green_band}, {blue_band}")
-            
-            # Create simple RGB icon
-            pixmap = QPixmap(48, 16)
-            painter = QPainter(pixmap)
-            painter.fillRect(0, 0, 16, 16, QColor(255, 0, 0))
-            painter.fillRect(16, 0, 16, 16, QColor(0, 255, 0))
-            painter.fillRect(32, 0, 16, 16, QColor(0, 0, 255))
-            painter.end()
-            
-            item.setIcon(0, QIcon(pixmap))
-            
-            # Store info
-            item.setData(0, Qt.ItemDataRole.UserRole, raster_layer.id())
-            item.setData(0, Qt.ItemDataRole.UserRole + 1, "raster_rgb")
-            
-            # Make text slightly smaller
-            font = item.font(0)
-            font.setPointSize(font.pointSize() - 1)
-            item.setFont(0, font)
+            LayerTreeBuilder._make_child(
+                parent_item, f"RGB: {red_band}, {green_band}, {blue_band}",
+                raster_layer.id(), "raster_rgb", icon=_rgb_icon()
+            )
             
         except Exception:
             pass
     
     @staticmethod
-    def get_layer_icon(layer):
+    def get_layer_icon(layer, map_layer_type=None):
         """
         Get the appropriate icon for a layer type.
         
         Args:
             layer: QgsMapLayer
+            map_layer_type: layer.type(), if the caller already has it
             
         Returns:
             QIcon or None
         """
         try:
-            if layer.type() == QgsMapLayer.VectorLayer:
-                return QIcon(":/images/themes/default/mIconVector.svg")
-            elif layer.type() == QgsMapLayer.RasterLayer:
-                return QIcon(":/images/themes/default/mIconRaster.svg")
+            if map_layer_type is None:
+                map_layer_type = layer.type()
+            if map_layer_type == QgsMapLayer.VectorLayer:
+                return resource_icon(":/images/themes/default/mIconVector.svg")
+            elif map_layer_type == QgsMapLayer.RasterLayer:
+                return resource_icon(":/images/themes/default/mIconRaster.svg")
         except Exception:
             pass
         return None
+
+
+# Vector renderer type -> builder for its symbology items
+_VECTOR_SYMBOLOGY_BUILDERS = {
+    QgsCategorizedSymbolRenderer: LayerTreeBuilder._add_categorized_items,
+    QgsGraduatedSymbolRenderer: LayerTreeBuilder._add_graduated_items,
+    QgsSingleSymbolRenderer: LayerTreeBuilder._add_single_symbol_icon,
+    QgsRuleBasedRenderer: LayerTreeBuilder._add_rule_items,
+}
+
+# Raster renderer type -> builder for its symbology items
+_RASTER_SYMBOLOGY_BUILDERS = {
+    QgsPalettedRasterRenderer: LayerTreeBuilder._add_raster_palette_items,
+    QgsSingleBandPseudoColorRenderer: LayerTreeBuilder.add_raster_gradient_item,
+    QgsSingleBandGrayRenderer: LayerTreeBuilder.add_raster_gray_gradient_item,
+    QgsMultiBandColorRenderer: LayerTreeBuilder.add_raster_rgb_item,
+    QgsRasterContourRenderer: LayerTreeBuilder.add_raster_contour_items,
+}
+
+
+def _symbology_builder(builders, renderer):
+    """
+    Find the symbology builder for a renderer.
+    
+    Exact renderer types are a single dict lookup. A subclass falls back to
+    the nearest base class in its MRO, and the result (including None) is
+    stored under the subclass so the walk happens once per type.
+    
+    Args:
+        builders: Renderer type -> builder dict
+        renderer: Layer renderer
+        
+    Returns:
+        Builder callable or None
+    """
+    renderer_type = type(renderer)
+    try:
+        return builders[renderer_type]
+    except KeyError:
+        pass
+    
+    builder = None
+    for base in renderer_type.__mro__[1:]:
+        builder = builders.get(base)
+        if builder:
+            break
+    builders[renderer_type] = builder
+    return builder
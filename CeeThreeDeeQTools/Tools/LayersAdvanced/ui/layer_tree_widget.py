@@ -2,9 +2,11 @@
 
 from qgis.PyQt.QtWidgets import QTreeWidget, QTreeWidgetItem
 from qgis.PyQt.QtCore import Qt, pyqtSignal
-from qgis.PyQt.QtGui import QIcon
 from qgis.core import QgsMapLayer
 
+from ..roles import ROLE_ID
+from .icons import resource_icon
+
 
 class LayerTreeWidget(QTreeWidget):
     """Custom tree widget for layer display and management."""
@@ -42,7 +44,7 @@ class LayerTreeWidget(QTreeWidget):
         
         # Set layer name and ID
         item.setText(0, layer.name())
-        item.setData(0, Qt.ItemDataRole.UserRole, layer.id())
+        item.setData(0, ROLE_ID, layer.id())
         
         # Set checkbox for visibility
         item.setCheckState(0, Qt.CheckState.Checked if is_visible else Qt.CheckState.Unchecked)
@@ -62,9 +64,9 @@ class LayerTreeWidget(QTreeWidget):
         """Get the appropriate icon for a layer type."""
         try:
             if layer.type() == QgsMapLayer.VectorLayer:
-                return QIcon(":/images/themes/default/mIconVector.svg")
+                return resource_icon(":/images/themes/default/mIconVector.svg")
             elif layer.type() == QgsMapLayer.RasterLayer:
-                return QIcon(":/images/themes/default/mIconRaster.svg")
+                return resource_icon(":/images/themes/default/mIconRaster.svg")
         except Exception:
             pass
         return None
@@ -74,7 +76,7 @@ class LayerTreeWidget(QTreeWidget):
         if column != 0:
             return
         
-        layer_id = item.data(0, Qt.ItemDataRole.UserRole)
+        layer_id = item.data(0, ROLE_ID)
         is_checked = item.checkState(0) == Qt.CheckState.Checked
         self.layerVisibilityChanged.emit(layer_id, is_checked)
     
@@ -82,7 +84,7 @@ class LayerTreeWidget(QTreeWidget):
         """Handle selection change."""
         selected_items = self.selectedItems()
         if selected_items:
-            layer_id = selected_items[0].data(0, Qt.ItemDataRole.UserRole)
+            layer_id = selected_items[0].data(0, ROLE_ID)
             self.layerSelected.emit(layer_id)
     
     def update_all_visibility(self, visible):
@@ -92,15 +94,33 @@ class LayerTreeWidget(QTreeWidget):
         Args:
             visible: Boolean indicating visibility state
         """
-        self.itemChanged.disconnect(self._on_item_changed)
+        count = self.topLevelItemCount()
+        if not count:
+            return
         
+        # With the model's signals blocked no per-row dataChanged or
+        # itemChanged is emitted; the view is told once at the end
+        model = self.model()
+        check_state = Qt.CheckState.Checked if visible else Qt.CheckState.Unchecked
+        updates_were_enabled = self.updatesEnabled()
+        self.setUpdatesEnabled(False)
+        was_blocked = model.blockSignals(True)
         try:
-            check_state = Qt.CheckState.Checked if visible else Qt.CheckState.Unchecked
-            for i in range(self.topLevelItemCount()):
+            for i in range(count):
                 item = self.topLevelItem(i)
-                item.setCheckState(0, check_state)
+                if item.checkState(0) != check_state:
+                    item.setCheckState(0, check_state)
         finally:
-            self.itemChanged.connect(self._on_item_changed)
+            model.blockSignals(was_blocked)
+            
+            # QTreeWidget turns dataChanged into itemChanged for the first
+            # row, which must not reach _on_item_changed
+            widget_blocked = self.blockSignals(True)
+            model.dataChanged.emit(
+                model.index(0, 0), model.index(count - 1, 0), [Qt.ItemDataRole.CheckStateRole]
+            )
+            self.blockSignals(widget_blocked)
+            self.setUpdatesEnabled(updates_were_enabled)
     
     def filter_items(self, text):
         """
@@ -109,18 +129,30 @@ class LayerTreeWidget(QTreeWidget):
         Args:
             text: Search string
         """
-        text = text.lower()
+        # Let Qt do the case-insensitive substring match on the name column
+        # (sip hands back the same wrapper for an item, so the set is keyed
+        # on identity)
+        if text:
+            shown = set(self.findItems(text, Qt.MatchFlag.MatchContains, 0))
+        else:
+            shown = None
         
-        for i in range(self.topLevelItemCount()):
-            item = self.topLevelItem(i)
-            layer_name = item.text(0).lower()
-            should_show = text in layer_name if text else True
-            item.setHidden(not should_show)
+        # Relayout once after the pass, and only touch items that change
+        updates_were_enabled = self.updatesEnabled()
+        self.setUpdatesEnabled(False)
+        try:
+            for i in range(self.topLevelItemCount()):
+                item = self.topLevelItem(i)
+                hide = shown is not None and item not in shown
+                if item.isHidden() != hide:
+                    item.setHidden(hide)
+        finally:
+            self.setUpdatesEnabled(updates_were_enabled)
     
     def get_all_layer_ids(self):
         """Get all layer IDs from the tree."""
         layer_ids = []
         for i in range(self.topLevelItemCount()):
             item = self.topLevelItem(i)
-            layer_ids.append(item.data(0, Qt.ItemDataRole.UserRole))
+            layer_ids.append(item.data(0, ROLE_ID))
         return layer_ids
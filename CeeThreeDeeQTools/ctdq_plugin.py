@@ -393,6 +393,7 @@ class CTDQPlugin(object):
 
         # Remove the Layers Advanced dock widget
         if self.layersAdvancedDock:
+            self.layersAdvancedDock.close()
             self.iface.removeDockWidget(self.layersAdvancedDock)
             self.layersAdvancedDock = None
 